@@ -1,28 +1,25 @@
 import streamlit as st
 import pandas as pd
-import requests
 import math
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from datetime import datetime
 import time
+from cartola_core import (
+    configurar, medir_etapa, etapas_medidas, sessao_atual, chamadas_sheets_ultimo_minuto,
+    iniciar_sincronia, carregar_periodo, salvar_periodo, carregar_dados_versionados, salvar_dados, resetar_banco_dados,
+    buscar_ligas, calcular, substituir_rodada, normalizar_planilha_ranking, recalcular_temporada, detectar_alteracoes,
+    ler_rankings_em_lote, lancar_rodadas_em_lote, buscar_historico_liga, simular_regras, rotulo_cenario,
+    visoes_derivadas, janela_resumo, propagar_pagamentos, iniciar_monitor_ranking, ranking_ao_vivo,
+    acumulado_arquivado, linhas_arquivaveis, arquivar_ate, historico_completo, turno_da_rodada,
+    VALOR_RODADA, PCT_PAGANTES, LIMITE_MAX_PAGAMENTOS, SLUG_LIGA_PADRAO, NOME_ABA_PERIODO, RODADA_MAXIMA, COTA_SHEETS_POR_MINUTO,
+    TOTAL_RODADAS_TURNO, NOME_ABA_ACUMULADO, PREFIXO_ABA_ARQUIVO,
+)
 
 # --- 1. CONFIGURAÇÕES ---
-VALOR_RODADA = 7.00
-LIMITE_MAX_PAGAMENTOS = 10
-PCT_PAGANTES = 0.25
-SLUG_LIGA_PADRAO = "os-pia-do-cartola"
 SENHA_ADMIN = st.secrets["cartola"]["senha_admin"]
-NOME_PLANILHA_GOOGLE = "Controle_Cartola_2026"
-NOME_ABA_DADOS = "Dados"
-NOME_ABA_CONFIG = "Config"
-TOTAL_RODADAS_TURNO = 19
-NOME_ABA_PERIODO = "Periodo"
-PERIODO_INICIO_PADRAO = 1
-PERIODO_FIM_PADRAO = 19
-RODADA_MAXIMA = 380
+RODADAS_POR_JANELA = 10  # colunas de rodada por pagina na visao em janelas do Resumo
+TIMES_POR_JANELA = 50
 
-COLUNAS_ESPERADAS = ["Data", "Rodada", "Time", "Valor", "Pago", "Motivo", "Posição"]
+# O nucleo le os segredos do Streamlit e mostra os avisos na pagina (st.error / st.warning)
+configurar(segredos=st.secrets, avisos=lambda nivel, msg: getattr(st, nivel)(msg))
 
 # --- 2. SETUP VISUAL ---
 st.set_page_config(page_title="Gestão Cartola PRO", layout="wide", page_icon="⚽")
@@ -48,254 +45,21 @@ configurar_css()
 # --- 3. AUTENTICAÇÃO ---
 if 'admin_unlocked' not in st.session_state: st.session_state['admin_unlocked'] = False
 
+def mover_pagina(chave, passo, n_paginas):
+    atual = st.session_state.get(chave, n_paginas - 1)
+    st.session_state[chave] = max(0, min(atual + passo, n_paginas - 1))
+
+def lista_de_numeros(texto):
+    """"5, 7.5; 10" -> [5.0, 7.5, 10.0] (separa por virgula, ponto e virgula ou espaco; decimal com ponto)."""
+    return [float(x) for x in texto.replace(";", " ").replace(",", " ").split()]
+
 def verificar_senha():
     if st.session_state.get('senha_input') == SENHA_ADMIN:
         st.session_state['admin_unlocked'] = True
     else:
         st.toast("⛔ Senha incorreta!", icon="❌")
 
-# --- 4. CONEXÃO GOOGLE SHEETS ---
-@st.cache_resource
-def conectar_gsheets():
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    try:
-        if "gcp_service_account" in st.secrets:
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(dict(st.secrets["gcp_service_account"]), scope)
-        else:
-            creds = ServiceAccountCredentials.from_json_keyfile_name("credentials.json", scope)
-        client = gspread.authorize(creds)
-        return client.open(NOME_PLANILHA_GOOGLE).worksheet(NOME_ABA_DADOS)
-    except: return None
-
-def conectar_planilha_config():
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    try:
-        if "gcp_service_account" in st.secrets:
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(dict(st.secrets["gcp_service_account"]), scope)
-        else:
-            creds = ServiceAccountCredentials.from_json_keyfile_name("credentials.json", scope)
-        client = gspread.authorize(creds)
-        return client.open(NOME_PLANILHA_GOOGLE).worksheet(NOME_ABA_CONFIG)
-    except: return None
-
-def conectar_planilha_periodo():
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    try:
-        if "gcp_service_account" in st.secrets:
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(dict(st.secrets["gcp_service_account"]), scope)
-        else:
-            creds = ServiceAccountCredentials.from_json_keyfile_name("credentials.json", scope)
-        client = gspread.authorize(creds)
-        planilha = client.open(NOME_PLANILHA_GOOGLE)
-        try:
-            return planilha.worksheet(NOME_ABA_PERIODO)
-        except Exception:
-            ws = planilha.add_worksheet(title=NOME_ABA_PERIODO, rows=10, cols=5)
-            ws.update_acell("A1", "Inicio")
-            ws.update_acell("B1", "fim")
-            ws.update_acell("A2", PERIODO_INICIO_PADRAO)
-            ws.update_acell("B2", PERIODO_FIM_PADRAO)
-            return ws
-    except: return None
-
-@st.cache_data(ttl=300, show_spinner=False)
-def carregar_periodo():
-    """Le rodada de inicio (A2) e fim (B2) da aba Periodo, com validacao."""
-    inicio, fim = PERIODO_INICIO_PADRAO, PERIODO_FIM_PADRAO
-    ws = conectar_planilha_periodo()
-    if ws:
-        try:
-            v_ini = ws.acell("A2").value
-            v_fim = ws.acell("B2").value
-            if v_ini not in (None, ""): inicio = int(float(str(v_ini).strip().replace(",", ".")))
-            if v_fim not in (None, ""): fim = int(float(str(v_fim).strip().replace(",", ".")))
-        except: pass
-    inicio = max(1, min(inicio, RODADA_MAXIMA))
-    fim = max(1, min(fim, RODADA_MAXIMA))
-    if inicio > fim: inicio, fim = fim, inicio
-    return inicio, fim
-
-def salvar_periodo(inicio, fim):
-    ws = conectar_planilha_periodo()
-    if ws:
-        try:
-            ws.update_acell("A1", "Inicio")
-            ws.update_acell("B1", "fim")
-            ws.update_acell("A2", int(inicio))
-            ws.update_acell("B2", int(fim))
-            carregar_periodo.clear()  # invalida o cache do periodo apos salvar
-            return True
-        except Exception as e:
-            st.error(f"Erro ao salvar periodo na aba {NOME_ABA_PERIODO}: {e}")
-    return False
-
-def resetar_banco_dados():
-    sheet = conectar_gsheets()
-    if sheet:
-        sheet.clear()
-        sheet.append_row(COLUNAS_ESPERADAS)
-        carregar_dados.clear()  # invalida o cache apos resetar
-        return True
-    return False
-
-@st.cache_data(ttl=300, show_spinner=False)
-def carregar_dados():
-    sheet = conectar_gsheets()
-    if not sheet: return pd.DataFrame(columns=COLUNAS_ESPERADAS), "Erro Conexão"
-    try:
-        data = sheet.get_all_records()
-        if not data:
-            return pd.DataFrame(columns=COLUNAS_ESPERADAS), "Vazio"
-        
-        df = pd.DataFrame(data)
-        df.columns = [str(c).strip() for c in df.columns]
-
-        if "Pontos" in df.columns and "Posição" not in df.columns:
-            df.rename(columns={"Pontos": "Posição"}, inplace=True)
-
-        if "Time" in df.columns: df = df[df["Time"].astype(str) != "Time"]
-        if "Valor" in df.columns: df = df[df["Valor"].astype(str) != "Valor"]
-
-        for col in COLUNAS_ESPERADAS:
-            if col not in df.columns: df[col] = None
-            
-        if "Valor" in df.columns:
-            df["Valor"] = pd.to_numeric(
-                df["Valor"].astype(str).str.replace("R$", "", regex=False).str.replace(",", ".", regex=False),
-                errors='coerce'
-            ).fillna(0.0)
-        
-        if "Rodada" in df.columns:
-            df["Rodada"] = pd.to_numeric(df["Rodada"], errors='coerce').fillna(0).astype(int)
-            
-        if "Pago" in df.columns:
-            df["Pago"] = df["Pago"].astype(str).str.upper().apply(lambda x: True if x in ["TRUE", "VERDADEIRO", "SIM", "1"] else False)
-
-        return df, "Sucesso"
-    except Exception as e:
-        return pd.DataFrame(columns=COLUNAS_ESPERADAS), f"Erro Leitura: {e}"
-
-def salvar_dados(df):
-    sheet = conectar_gsheets()
-    if sheet:
-        df_save = df.reindex(columns=COLUNAS_ESPERADAS).copy()
-        df_save["Pago"] = df_save["Pago"].apply(lambda x: "TRUE" if x is True else "FALSE")
-        df_save["Data"] = df_save["Data"].astype(str).replace("nan", "")
-        df_save["Valor"] = df_save["Valor"].fillna(0.0)
-        df_save["Rodada"] = df_save["Rodada"].fillna(0).astype(int)
-        df_save = df_save.fillna("")
-        sheet.clear()
-        sheet.update([df_save.columns.values.tolist()] + df_save.values.tolist())
-        carregar_dados.clear()  # invalida o cache para reler dados atualizados no proximo rerun
-
-# --- 5. LÓGICA DE CÁLCULO E API ---
-def obter_refresh_token():
-    sheet_config = conectar_planilha_config()
-    if sheet_config:
-        try:
-            val = sheet_config.acell('A2').value
-            if val and len(val) > 50: return val.strip()
-        except: pass
-    return st.secrets["cartola"]["refresh_token"].strip()
-
-def salvar_novo_refresh_token(novo_rt):
-    sheet_config = conectar_planilha_config()
-    if sheet_config:
-        try:
-            sheet_config.update_acell('A1', 'RefreshToken_Atualizado')
-            sheet_config.update_acell('A2', novo_rt)
-        except Exception as e:
-            st.error(f"Erro ao salvar token no separador Config: {e}")
-
-def gerar_token_fresco():
-    try:
-        refresh_token_atual = obter_refresh_token()
-        url_auth = "https://goidc.globo.com/auth/realms/globo.com/protocol/openid-connect/token"
-        payload = {
-            'client_id': 'cartola-web@apps.globoid',
-            'grant_type': 'refresh_token',
-            'refresh_token': refresh_token_atual
-        }
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
-        }
-        response = requests.post(url_auth, data=payload, headers=headers)
-        
-        if response.status_code == 200:
-            dados = response.json()
-            novo_access = dados.get('access_token')
-            novo_refresh = dados.get('refresh_token')
-            
-            if novo_refresh and novo_refresh != refresh_token_atual:
-                salvar_novo_refresh_token(novo_refresh)
-                
-            return novo_access
-        else:
-            st.error(f"Erro na renovação do token na Globo. Código: {response.status_code}")
-            return None
-    except Exception as e:
-        st.error(f"Erro interno na renovação do token: {e}")
-        return None
-
-def buscar_api(slug):
-    try:
-        if "cartola" not in st.secrets or "refresh_token" not in st.secrets["cartola"]:
-            st.error("⚠️ Refresh Token não configurado em [cartola] nos Secrets.")
-            return None
-
-        token = gerar_token_fresco()
-        if not token:
-            st.error("⚠️ O Refresh Token expirou ou é inválido. Atualize o ficheiro secrets.toml.")
-            return None
-
-        url = f"https://api.cartola.globo.com/auth/liga/{slug}"
-        headers = { 'Authorization': f'Bearer {token}', 'User-Agent': 'Mozilla/5.0' }
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            dados = response.json()
-            if dados and 'times' in dados:
-                df_bruto = pd.DataFrame(dados['times'])
-                df_export = pd.DataFrame()
-                df_export['Time'] = df_bruto['nome_cartola']
-                df_export['Posição'] = df_bruto['ranking'].apply(
-                    lambda x: float(x.get('rodada')) if isinstance(x, dict) and x.get('rodada') is not None else 999.0
-                )
-                df_export = df_export.sort_values(by='Posição', ascending=True).reset_index(drop=True)
-                return df_export
-            return None
-        else:
-            st.error(f"Erro na comunicação com o Cartola: Código {response.status_code}")
-            return None
-    except Exception as e:
-        st.error(f"Erro ao tentar importar os dados: {e}")
-        return None
-
-def calcular(df_ranking, df_hist, rod):
-    if df_ranking.empty: return [], [], [], 0, 0
-    
-    qtd = int((len(df_ranking) * PCT_PAGANTES) + 0.5)
-    rank = df_ranking.sort_values("Posição", ascending=False).reset_index(drop=True)
-    
-    conta = pd.Series(dtype=int)
-    if not df_hist.empty and "Rodada" in df_hist.columns and "Valor" in df_hist.columns:
-        validos = df_hist[(df_hist["Rodada"] != rod) & (df_hist["Valor"] > 0)]
-        if not validos.empty: conta = validos["Time"].value_counts()
-    
-    devs, imune, salvos = [], [], []
-    for _, r in rank.iterrows():
-        t, p = r['Time'], r['Posição']
-        if len(devs) < qtd:
-            if conta.get(t, 0) < LIMITE_MAX_PAGAMENTOS:
-                devs.append({"Data": datetime.now().strftime("%Y-%m-%d"), "Rodada": rod, "Time": t, "Valor": VALOR_RODADA, "Pago": False, "Motivo": "Lanterna", "Posição": p})
-            else:
-                imune.append({"Data": datetime.now().strftime("%Y-%m-%d"), "Rodada": rod, "Time": t, "Valor": 0.0, "Pago": True, "Motivo": "Imune (>10)", "Posição": p})
-        else:
-            salvos.append({"Data": datetime.now().strftime("%Y-%m-%d"), "Rodada": rod, "Time": t, "Valor": 0.0, "Pago": True, "Motivo": "Salvo", "Posição": p})
-    return devs, imune, salvos, len(df_ranking), qtd
-
-# --- 6. INTERFACE ---
+# --- 4. INTERFACE ---
 # Título Híbrido com Status Integrado
 if st.session_state['admin_unlocked']:
     status_html = '<span style="font-size: 0.45em; color: #28a745; font-weight: normal; vertical-align: middle;">(Admin Ativo)</span>'
@@ -304,8 +68,11 @@ else:
 
 st.markdown(f'<h1 style="margin-bottom: 0;">⚽ Os Piá do Cartola {status_html}</h1>', unsafe_allow_html=True)
 
+st.session_state['inicio_rerun'] = time.time()
+iniciar_sincronia()
+iniciar_monitor_ranking()
 rodada_inicio, rodada_fim = carregar_periodo()
-df_fin, status_msg = carregar_dados()
+df_fin, status_msg, versao_dados = carregar_dados_versionados()
 
 tab_resumo, tab_pendencias, tab_admin = st.tabs(["📋 Resumo", "💰 Pendências", "⚙️ Painel Admin"])
 
@@ -314,50 +81,67 @@ with tab_resumo:
     valid_db = not df_fin.empty and "Time" in df_fin.columns and "Valor" in df_fin.columns
     if valid_db:
         try:
-            df_v = df_fin.copy()
-            df_v["V"] = df_v.apply(lambda x: None if x["Valor"] == 0 else x["Pago"], axis=1)
-            df_v["Rodada_Str"] = df_v["Rodada"].astype(int).astype(str)
-            matrix = df_v.pivot_table(index="Time", columns="Rodada_Str", values="V", aggfunc="last")
-            todas_rodadas = [str(i) for i in range(rodada_inicio, rodada_fim + 1)]
-            matrix = matrix.reindex(columns=todas_rodadas)
-            matrix = matrix.astype(object)
-            matrix = matrix.where(pd.notnull(matrix), None)
-
-            cobrancas = df_fin[df_fin["Valor"] > 0]["Time"].value_counts().rename("Cobranças")
-            disp = pd.DataFrame(index=df_fin["Time"].unique()).join(cobrancas).fillna(0).astype(int)
-            disp = disp.join(matrix)
-            disp.insert(0, "Status", disp["Cobranças"].apply(lambda x: "⚠️ >10" if x >= LIMITE_MAX_PAGAMENTOS else "Ativo"))
+            visoes = visoes_derivadas(versao_dados, df_fin, rodada_inicio, rodada_fim)
+            disp, todas_rodadas = visoes["resumo"]
             
-            # Tabela Congelada mantida
-            disp.index.name = "Time"
-            disp = disp.sort_index()
+            # Visão em janelas: uma página de rodadas (e opcionalmente de times) por vez, o resto resumido
+            visiveis, fatia_times = todas_rodadas, None
+            if st.toggle("📱 Visão em janelas", value=len(todas_rodadas) > RODADAS_POR_JANELA, key="resumo_janela",
+                         help="Mostra uma página de rodadas por vez; as de fora aparecem resumidas como pagas/cobradas."):
+                n_pag = max(1, math.ceil(len(todas_rodadas) / RODADAS_POR_JANELA))
+                pag = min(st.session_state.get("pagina_rodadas", n_pag - 1), n_pag - 1)
+                cn1, cn2, cn3 = st.columns([1, 4, 1])
+                cn1.button("◀", on_click=mover_pagina, args=("pagina_rodadas", -1, n_pag), disabled=pag == 0, use_container_width=True)
+                cn3.button("▶", on_click=mover_pagina, args=("pagina_rodadas", 1, n_pag), disabled=pag >= n_pag - 1, use_container_width=True)
+                visiveis = todas_rodadas[pag * RODADAS_POR_JANELA:(pag + 1) * RODADAS_POR_JANELA]
+                cn2.caption(f"Rodadas {visiveis[0]} a {visiveis[-1]} (página {pag + 1} de {n_pag})")
+                if len(disp) > TIMES_POR_JANELA:
+                    n_grupos = math.ceil(len(disp) / TIMES_POR_JANELA)
+                    grupo = st.selectbox("Times", range(n_grupos), key="pagina_times",
+                                         format_func=lambda g: f"{g * TIMES_POR_JANELA + 1}–{min((g + 1) * TIMES_POR_JANELA, len(disp))} de {len(disp)}")
+                    fatia_times = slice(grupo * TIMES_POR_JANELA, (grupo + 1) * TIMES_POR_JANELA)
+            grade = janela_resumo(disp, todas_rodadas, visiveis, fatia_times)
+            
+            # Edicoes pendentes (Time, Rodada) -> Pago sobrevivem a troca de janela ate o Salvar
+            pendentes = st.session_state.setdefault("edicoes_resumo", {})
+            if st.session_state['admin_unlocked'] and pendentes:
+                grade = grade.copy()
+                for (t, r), v in pendentes.items():
+                    if t in grade.index and r in visiveis: grade.at[t, r] = v
             
             cfg = {
                 "Status": st.column_config.TextColumn(width="small", disabled=True),
                 "Cobranças": st.column_config.NumberColumn(width="small", disabled=True)
             }
-            for c in todas_rodadas:
+            for c in grade.columns:
+                if c not in visiveis and c not in cfg: cfg[c] = st.column_config.TextColumn(width="small", disabled=True)
+            for c in visiveis:
                 cfg[c] = st.column_config.CheckboxColumn(f"{c}", width="small", disabled=not st.session_state['admin_unlocked'])
             
-            edit = st.data_editor(disp, column_config=cfg, height=600, use_container_width=True, key="editor_resumo")
+            with medir_etapa("resumo_editor"):
+                st.data_editor(grade, column_config=cfg, height=600, use_container_width=True, key="editor_resumo")
             
             if st.session_state['admin_unlocked']:
-                m = edit.reset_index().melt(id_vars=["Time"], value_vars=todas_rodadas, var_name="Rodada", value_name="Nv").dropna(subset=["Nv"])
-                df_edit = df_fin.copy()
-                change = False
-                if not m.empty:
-                    for _, r in m.iterrows():
-                        mask = (df_edit["Time"]==r["Time"]) & (df_edit["Rodada"]==int(r["Rodada"])) & (df_edit["Valor"]>0)
-                        if mask.any():
-                            idx = df_edit[mask].index[0]
-                            if bool(df_edit.at[idx, "Pago"]) != bool(r["Nv"]):
-                                df_edit.at[idx, "Pago"] = bool(r["Nv"]); change = True
+                # So as celulas tocadas pelo usuario (estado do widget), nao a matriz inteira
+                editadas = st.session_state.get("editor_resumo", {}).get("edited_rows", {})
+                for i, cols in editadas.items():
+                    for c, v in cols.items():
+                        if c in visiveis and v is not None: pendentes[(grade.index[int(i)], c)] = bool(v)
+                edicoes = pd.DataFrame([(t, r, v) for (t, r), v in pendentes.items()], columns=["Time", "Rodada", "Nv"])
+                alteracoes = detectar_alteracoes(df_fin, edicoes)
+                change = not alteracoes.empty
+                df_edit = df_fin
+                if change:
+                    df_edit = df_fin.copy()
+                    df_edit.loc[alteracoes.index, "Pago"] = alteracoes.values
                 
                 if change:
                     st.warning("⚠️ Há alterações não salvas. Clique em **Salvar Alterações** para gravar no banco.")
                 
                 if st.button("💾 Salvar Alterações", type="primary", disabled=not change, use_container_width=True):
-                    salvar_dados(df_edit)
+                    salvar_dados(df_edit, df_fin)
+                    propagar_pagamentos(versao_dados, df_fin, alteracoes)
+                    st.session_state["edicoes_resumo"] = {}
                     st.toast("✅ Atualizado!", icon="☁️")
                     time.sleep(1)
                     st.rerun()
@@ -368,9 +152,7 @@ with tab_resumo:
 with tab_pendencias:
     if valid_db:
         try:
-            pg = df_fin[(df_fin["Pago"] == True) & (df_fin["Valor"] > 0)]["Valor"].sum()
-            ab = df_fin[(df_fin["Pago"] == False) & (df_fin["Valor"] > 0)]["Valor"].sum()
-            max_rod = int(df_fin["Rodada"].max()) if not df_fin["Rodada"].empty else 0
+            pg, ab, max_rod, tabela_dev = visoes_derivadas(versao_dados, df_fin, rodada_inicio, rodada_fim)["pendencias"]
 
             # NOVO PLACAR CUSTOMIZADO (Força a exibição lado a lado no Mobile)
             placar_html = f"""
@@ -391,13 +173,7 @@ with tab_pendencias:
             """
             st.markdown(placar_html, unsafe_allow_html=True)
             
-            df_devs = df_fin[(df_fin["Valor"] > 0) & (df_fin["Pago"] == False)].copy()
-            
-            if not df_devs.empty:
-                tabela_dev = df_devs.groupby("Time")["Valor"].sum().reset_index(name="Devendo")
-                tabela_dev = tabela_dev.sort_values("Devendo", ascending=False).reset_index(drop=True)
-                tabela_dev.index = tabela_dev.index + 1
-                
+            if not tabela_dev.empty:
                 col_tab, col_vazio = st.columns([1, 2])
                 with col_tab:
                     try:
@@ -428,6 +204,9 @@ with tab_admin:
             st.session_state['admin_unlocked'] = False
             st.rerun()
         st.divider()
+
+    # Turnos arquivados: as cobrancas deles contam no limite e nenhuma rodada deles pode ser relancada
+    cobrancas_arquivadas, _, arquivado_ate = acumulado_arquivado()
     
     with st.expander("🚨 Zona de Perigo"):
         if st.button("⚠️ RESETAR BANCO DE DADOS", type="primary"):
@@ -446,6 +225,118 @@ with tab_admin:
                 time.sleep(1)
                 st.rerun()
 
+    with st.expander("🗄️ Arquivar Turnos"):
+        st.caption(f"Tira da aba de dados as rodadas encerradas já quitadas: elas vão para abas '{PREFIXO_ABA_ARQUIVO}NN' (uma por turno de {TOTAL_RODADAS_TURNO} rodadas) e as cobranças e o pago de cada time ficam somados na aba '{NOME_ABA_ACUMULADO}', que continua valendo para o limite de {LIMITE_MAX_PAGAMENTOS} cobranças. Dívidas em aberto ficam no turno ativo. Leituras e gravações passam a tocar só o turno ativo.")
+        st.caption(f"Arquivado até a rodada {arquivado_ate}." if arquivado_ate else "Nada arquivado ainda.")
+        if arquivado_ate < RODADA_MAXIMA:
+            arquivar_rod = st.number_input("Arquivar até a rodada", arquivado_ate + 1, RODADA_MAXIMA, min(turno_da_rodada(arquivado_ate + 1) * TOTAL_RODADAS_TURNO, RODADA_MAXIMA), key="arquivar_ate")
+            saem = linhas_arquivaveis(df_fin, int(arquivar_rod))
+            abertas = int(((df_fin["Rodada"] <= arquivar_rod) & ~df_fin["Pago"].astype(bool) & (df_fin["Valor"] > 0)).sum()) if not df_fin.empty else 0
+            st.info(f"{len(saem)} linha(s) saem da aba de dados; {abertas} dívida(s) em aberto ficam no turno ativo.")
+            if st.button("🗄️ Arquivar", disabled=saem.empty):
+                try:
+                    arquivar_ate(int(arquivar_rod))
+                    st.toast("✅ Turno arquivado!", icon="🗄️")
+                    time.sleep(1)
+                    st.rerun()
+                except (ValueError, ConnectionError) as e: st.error(str(e))
+
+    with st.expander("♻️ Recalcular Temporada"):
+        st.caption(f"Refaz todas as rodadas em ordem a partir das posições gravadas, aplicando o limite de {LIMITE_MAX_PAGAMENTOS} cobranças de forma acumulada. Pagamentos já marcados são mantidos; turnos arquivados não mudam.")
+        if not df_fin.empty and "Rodada" in df_fin.columns:
+            df_rec = recalcular_temporada(df_fin, cobrancas_arquivadas, arquivado_ate)
+            mudancas = int(((df_rec["Valor"] != df_fin["Valor"]) | (df_rec["Motivo"].astype(str) != df_fin["Motivo"].astype(str))).sum())
+            st.info(f"{mudancas} lançamento(s) mudariam com o recálculo.")
+            if st.button("♻️ Aplicar Recálculo", disabled=mudancas == 0):
+                salvar_dados(df_rec, df_fin)
+                st.toast("✅ Temporada recalculada!", icon="♻️")
+                time.sleep(1)
+                st.rerun()
+
+    with st.expander("🧪 Simulador de Regras"):
+        st.caption(f"Refaz a temporada gravada (as posições de cada rodada) para cada combinação de regras, sem gravar nada. Regras atuais: R$ {VALOR_RODADA:.2f} por rodada, {PCT_PAGANTES:.0%} de pagantes e limite de {LIMITE_MAX_PAGAMENTOS} cobranças (sempre incluídas na grade).")
+        cs1, cs2, cs3 = st.columns(3)
+        txt_valores = cs1.text_input("Valores por rodada (R$)", f"5, {VALOR_RODADA:g}, 10", key="sim_valores")
+        txt_pcts = cs2.text_input("% de pagantes", f"20, {PCT_PAGANTES * 100:g}, 30", key="sim_pcts")
+        txt_limites = cs3.text_input("Limites de cobranças", f"8, {LIMITE_MAX_PAGAMENTOS}, 12", key="sim_limites")
+        if not df_fin.empty and "Posição" in df_fin.columns:
+            try:
+                grade_sim = (
+                    tuple(sorted({*lista_de_numeros(txt_valores), VALOR_RODADA})),
+                    tuple(sorted({*(p / 100 for p in lista_de_numeros(txt_pcts)), PCT_PAGANTES})),
+                    tuple(sorted({*lista_de_numeros(txt_limites), LIMITE_MAX_PAGAMENTOS})),
+                )
+                # Recalcula so quando a grade ou o livro-caixa mudam (os outros widgets do painel tambem disparam rerun)
+                if st.session_state.get("simulacao", (None,))[0] != (versao_dados, grade_sim):
+                    st.session_state["simulacao"] = ((versao_dados, grade_sim), *simular_regras(historico_completo(df_fin), *grade_sim))
+                _, cenarios, por_time = st.session_state["simulacao"]
+                atual = rotulo_cenario(VALOR_RODADA, PCT_PAGANTES, LIMITE_MAX_PAGAMENTOS)
+                st.caption(f"{len(cenarios)} cenário(s) · {len(por_time)} times")
+                st.dataframe(cenarios.style.format({
+                    "Valor": "R$ {:.2f}", "% Pagantes": "{:.0%}", "Limite": "{:.0f}", "Arrecadação": "R$ {:.2f}", "Maior cobrança": "R$ {:.2f}",
+                }), use_container_width=True)
+                escolhido = st.selectbox("Cobrança por time no cenário", list(cenarios.index), index=list(cenarios.index).index(atual), key="sim_cenario")
+                comparacao = pd.DataFrame({"Cenário": por_time[escolhido], "Regras atuais": por_time[atual]})
+                comparacao["Diferença"] = comparacao["Cenário"] - comparacao["Regras atuais"]
+                st.dataframe(comparacao.sort_values("Cenário", ascending=False).style.format("R$ {:.2f}"), use_container_width=True)
+            except ValueError: st.error("Use números separados por vírgula (decimais com ponto), ex.: 5, 7.5, 10")
+            except Exception as e: st.error(f"Erro Simulador: {e}")
+        else: st.info("Sem rodadas gravadas para simular.")
+
+    with st.expander("📥 Importar Histórico em Lote"):
+        fonte_lote = st.radio("Fonte do histórico:", ["Arquivo", "API do Cartola"], horizontal=True, key="fonte_lote")
+        chave_lote = None
+        try:
+            # Le e calcula uma vez por origem e versao do livro-caixa, nao a cada rerun
+            if fonte_lote == "Arquivo":
+                st.caption("Várias rodadas de uma vez: .xlsx (uma aba por rodada, colunas 1, 2, 3... com as posições, ou coluna Rodada), .csv ou .parquet. Cada rodada é calculada em ordem, já contando as cobranças das anteriores, e tudo é gravado numa única escrita.")
+                arq_lote = st.file_uploader("Arquivo de histórico", ["xlsx", "csv", "parquet"], key="arquivo_lote")
+                if arq_lote:
+                    chave_lote = ("arquivo", arq_lote.file_id, versao_dados)
+                    if st.session_state.get("lote", (None,))[0] != chave_lote:
+                        rankings = ler_rankings_em_lote(arq_lote)
+                        st.session_state["lote"] = (chave_lote, rankings, *lancar_rodadas_em_lote(df_fin, rankings, cobrancas_arquivadas, arquivado_ate))
+            else:
+                st.caption("Pontuação de cada time em cada rodada, direto da API; a posição na rodada sai da pontuação. Rodadas encerradas ficam em cache no servidor e não são buscadas de novo.")
+                ch1, ch2, ch3 = st.columns([2, 1, 1])
+                slug_lote = ch1.text_input("Slug da liga", SLUG_LIGA_PADRAO, key="slug_lote")
+                de_lote = int(ch2.number_input("De", 1, RODADA_MAXIMA, rodada_inicio, key="lote_de"))
+                ate_lote = int(ch3.number_input("Até", 1, RODADA_MAXIMA, rodada_fim, key="lote_ate"))
+                chave_lote = ("api", slug_lote.strip(), de_lote, ate_lote, versao_dados)
+                if de_lote > ate_lote: st.error("A rodada inicial não pode ser maior que a final.")
+                elif st.button("🔎 Buscar histórico"):
+                    with st.spinner("Buscando pontuações..."): rankings = buscar_historico_liga(slug_lote.strip(), de_lote, ate_lote)
+                    st.session_state["lote"] = (chave_lote, rankings, *lancar_rodadas_em_lote(df_fin, rankings, cobrancas_arquivadas, arquivado_ate))
+
+            if chave_lote and st.session_state.get("lote", (None,))[0] == chave_lote:
+                _, rankings, df_lote, resumo_lote = st.session_state["lote"]
+                st.dataframe(resumo_lote, hide_index=True, use_container_width=True)
+                ja_lancadas = sorted(set(rankings) & set(df_fin["Rodada"].astype(int))) if not df_fin.empty else []
+                if ja_lancadas: st.warning(f"Rodadas já lançadas que serão substituídas: {', '.join(map(str, ja_lancadas))}")
+                if st.button(f"📥 Importar {len(rankings)} rodada(s)", type="primary", disabled=not rankings):
+                    salvar_dados(df_lote, df_fin)
+                    st.session_state.pop("lote", None)
+                    st.toast("✅ Histórico importado!", icon="📥")
+                    time.sleep(1)
+                    st.rerun()
+        except ValueError as e: st.error(str(e))
+        except Exception as e: st.error(f"Erro Importação: {e}")
+
+    with st.expander("⏱️ Desempenho e Cota do Sheets"):
+        chamadas = chamadas_sheets_ultimo_minuto()
+        st.progress(min(chamadas / COTA_SHEETS_POR_MINUTO, 1.0), text=f"Google Sheets: {chamadas} chamada(s) no último minuto (cota {COTA_SHEETS_POR_MINUTO}/min)")
+        etapas = pd.DataFrame(etapas_medidas(), columns=["inicio", "etapa", "ms", "sessao"])
+        inicio_rerun = st.session_state.get('inicio_rerun', 0)
+        rerun = etapas[(etapas["sessao"] == sessao_atual()) & (etapas["inicio"] >= inicio_rerun)]
+        st.caption(f"Este rerun (até aqui): {rerun['ms'].sum():.0f} ms em etapas medidas")
+        st.dataframe(rerun[["etapa", "ms"]], hide_index=True, use_container_width=True)
+        if not etapas.empty:
+            st.caption(f"Últimas {len(etapas)} etapas do processo (todas as sessões)")
+            resumo = etapas.groupby("etapa")["ms"].agg(chamadas="count", p50="median", p95=lambda x: x.quantile(0.95), max="max", total="sum")
+            st.dataframe(resumo.sort_values("total", ascending=False).round(1), use_container_width=True)
+            log = etapas.assign(inicio=pd.to_datetime(etapas["inicio"], unit="s").dt.strftime("%Y-%m-%dT%H:%M:%S.%f")).to_json(orient="records", lines=True, force_ascii=False)
+            st.download_button("⬇️ Exportar log (JSON Lines)", log, file_name="telemetria_cartola.jsonl", mime="application/x-ndjson")
+
     st.divider()
 
     st.subheader("Lançar Rodada")
@@ -456,26 +347,42 @@ with tab_admin:
     if 'temp' not in st.session_state: st.session_state['temp'] = pd.DataFrame(columns=["Time", "Posição"])
     
     if origem == "API":
-        slug = st.text_input("Slug", SLUG_LIGA_PADRAO)
+        slug = st.text_input("Slug", SLUG_LIGA_PADRAO, help="Separe vários slugs por vírgula para buscar as ligas em paralelo.")
+        slugs = [s.strip() for s in slug.split(",") if s.strip()]
+        ao_vivo = {s: e for s in slugs if (e := ranking_ao_vivo(s))}
+        if ao_vivo:
+            agora = time.time()
+            st.caption(" · ".join(f"📡 {s}: rodada {e['rodada']}, verificado há {int(agora - e['verificado'])}s" + (" ⚠️" if e['erro'] else "") for s, e in ao_vivo.items()))
+            if st.button("Usar ranking ao vivo", help="Última versão trazida pelo monitor em segundo plano, sem nova consulta à API."):
+                st.session_state['rankings_api'] = {s: e['ranking'] for s, e in ao_vivo.items()}
+                st.session_state['temp'] = next(iter(ao_vivo.values()))['ranking']
+                st.rerun()
         if st.button("Buscar API"):
-            r = buscar_api(slug)
-            if r is not None: st.session_state['temp'] = r; st.rerun()
+            r = buscar_ligas(slugs)
+            ok = {s: df for s, df in r.items() if df is not None}
+            if ok:
+                st.session_state['rankings_api'] = ok
+                st.session_state['temp'] = next(iter(ok.values()))
+                st.rerun()
             else: st.error("Erro API")
+        if st.button(f"Buscar pontuação da rodada {rod} (histórico)", help="Para rodadas passadas: monta o ranking pela pontuação de cada time naquela rodada (só o primeiro slug)."):
+            try:
+                historico = buscar_historico_liga(slug.split(",")[0].strip(), int(rod), int(rod))
+                st.session_state['temp'] = historico.get(int(rod), pd.DataFrame(columns=["Time", "Posição"]))
+                st.rerun()
+            except Exception as e: st.error(f"Erro API: {e}")
+        rankings_api = st.session_state.get('rankings_api', {})
+        if len(rankings_api) > 1:
+            cl1, cl2 = st.columns([3, 1])
+            liga = cl1.selectbox("Liga", list(rankings_api))
+            if cl2.button("Usar esta liga", use_container_width=True):
+                st.session_state['temp'] = rankings_api[liga]; st.rerun()
     else:
         f = st.file_uploader("Excel", ["xlsx"])
         if f:
             try:
-                x = pd.read_excel(f)
-                x.columns = [str(c).strip().title() for c in x.columns]
-                mapa = {"Pontuação": "Posição", "Pts": "Posição", "Pontos": "Posição", "Pos": "Posição", "Nome": "Time", "Participante": "Time", "Equipe": "Time", "Cartoleiro": "Time"}
-                x = x.rename(columns=mapa)
-                if "Time" in x.columns:
-                    col_p = "Posição" if "Posição" in x.columns else None
-                    cols = ["Time", "Posição"] if col_p else ["Time"]
-                    st.session_state['temp'] = x[cols]
-                    if not col_p: st.session_state['temp']["Posição"] = 0.0
-                    st.session_state['temp'] = st.session_state['temp'].fillna(0)
-                else: st.error(f"Não achei coluna Time. Tem: {list(x.columns)}")
+                st.session_state['temp'] = normalizar_planilha_ranking(pd.read_excel(f))
+            except ValueError as e: st.error(str(e))
             except Exception as e: st.error(f"Erro Excel: {e}")
             
     st.session_state['temp'] = st.data_editor(st.session_state['temp'], num_rows="dynamic", use_container_width=True)
@@ -484,17 +391,13 @@ with tab_admin:
         if "Posição" not in st.session_state['temp'].columns: st.session_state['temp']["Posição"] = 0.0
         
         try:
-            d, i, s, t, p = calcular(st.session_state['temp'], df_fin, rod)
+            if rod <= arquivado_ate: raise ValueError(f"A rodada {rod} está num turno arquivado (até {arquivado_ate}).")
+            d, i, s, t, p = calcular(st.session_state['temp'], df_fin, rod, cobrancas_arquivadas)
             st.info(f"Simulação: {p} pagantes de {t} times.")
             
             if st.button("💾 Salvar Rodada"):
-                if not df_fin.empty and "Rodada" in df_fin.columns:
-                     df_limpo = df_fin[df_fin["Rodada"] != rod]
-                else:
-                     df_limpo = pd.DataFrame(columns=COLUNAS_ESPERADAS)
-                     
-                new = pd.concat([df_limpo, pd.DataFrame(d+i+s)], ignore_index=True)
-                salvar_dados(new)
+                new = substituir_rodada(df_fin, rod, d+i+s)
+                salvar_dados(new, df_fin)
                 st.toast("✅ Salvo!", icon="☁️")
                 time.sleep(2)
                 st.rerun()
@@ -0,0 +1,114 @@
+"""Benchmark offline dos caminhos quentes do app, com planilha e API falsas (planilha_fake.py).
+
+Uso:
+    python bench_cartola.py                              # grade padrao, JSON no stdout
+    python bench_cartola.py --times 20 200 2000 --rodadas 1 19 38 --saida bench.json
+
+Cada caso roda `--repeticoes` vezes; o JSON traz minimo e mediana em milissegundos por caso/tamanho.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import cartola_core
+import planilha_fake
+
+
+def carregar_nucleo():
+    """O nucleo headless (cartola_core), com segredos de mentira: nada aqui chama o Streamlit."""
+    cartola_core.configurar(segredos={"cartola": {"refresh_token": "r" * 64}})
+    return cartola_core
+
+
+def usar_backends(app, planilha, sessao, pasta):
+    """Aponta o app para os backends falsos e para um espelho SQLite e um cache da API novos em `pasta`.
+    O cache em disco nunca pode ser o de verdade: rodadas encerradas nao expiram e as respostas aqui sao sinteticas."""
+    app._abrir_planilha = lambda: planilha
+    app._abrir_aba.clear()
+    app._sessao_http = lambda: sessao
+    app._cofre_token.clear()
+    app._carregar_dados_versao.clear()
+    app.ARQUIVO_ESPELHO = os.path.join(pasta, f"espelho-{time.time_ns()}.sqlite")
+    app.PASTA_CACHE_API = os.path.join(pasta, f"cache-api-{time.time_ns()}")
+
+
+def medir(funcao, repeticoes, preparar=None):
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar: preparar()
+        ini = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - ini) * 1000)
+    return {"min_ms": round(min(tempos), 3), "mediana_ms": round(statistics.median(tempos), 3), "repeticoes": repeticoes}
+
+
+def rodar(app, n_times, n_rodadas, repeticoes, pasta):
+    grade = planilha_fake.gerar_livro_caixa(app.COLUNAS_ESPERADAS, n_times, n_rodadas, app.PCT_PAGANTES, app.VALOR_RODADA)
+    planilha = planilha_fake.planilha_com_livro(grade)
+    sessao = planilha_fake.SessaoCartolaFake(n_times)
+    usar_backends(app, planilha, sessao, pasta)
+
+    df_fin, status = app.carregar_dados()
+    assert status == "Sucesso", status
+    ranking = app.normalizar_ranking(sessao.get("https://api.cartola.globo.com/auth/liga/bench").json())
+    df_pago = df_fin.copy()
+    df_pago.loc[df_pago.index[df_pago["Valor"] > 0][:1], "Pago"] = ~df_pago.loc[df_pago.index[df_pago["Valor"] > 0][:1], "Pago"]
+
+    def espelho_novo():
+        usar_backends(app, planilha, sessao, pasta)
+
+    casos = {
+        "montar_dados": (lambda: app.montar_dados(grade), None),
+        "carregar_dados_frio": (app.carregar_dados, espelho_novo),
+        "carregar_dados_quente": (app.carregar_dados, None),
+        "resumo_pivot": (lambda: app.montar_matriz_resumo(df_fin, 1, max(n_rodadas, 1)), None),
+        "pendencias": (lambda: app.resumir_pendencias(df_fin), None),
+        "calcular": (lambda: app.calcular(ranking, df_fin, n_rodadas + 1), None),
+        "normalizar_ranking": (lambda: app.normalizar_ranking(sessao.get("https://api.cartola.globo.com/auth/liga/bench").json()), None),
+        "serializar_dados": (lambda: app.serializar_dados(df_fin), None),
+        "simular_regras_300": (lambda: app.simular_regras(df_fin, [5, 7, 10], [0.2, 0.25, 0.3, 0.35, 0.4], range(4, 24)), None),
+        "salvar_dados_completo": (lambda: app.salvar_dados(df_fin), None),
+        "salvar_dados_incremental": (lambda: app.salvar_dados(df_pago, app.carregar_dados()[0]), None),
+    }
+    saida = []
+    for nome, (funcao, preparar) in casos.items():
+        saida.append({"caso": nome, "times": n_times, "rodadas": n_rodadas, "linhas": len(grade) - 1, **medir(funcao, repeticoes, preparar)})
+    return saida
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--times", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--rodadas", type=int, nargs="+", default=[1, 19, 38])
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--saida", help="arquivo JSON de saida (padrao: stdout)")
+    args = parser.parse_args(argv)
+
+    app = carregar_nucleo()
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        for n_times in args.times:
+            for n_rodadas in args.rodadas:
+                if not 1 <= n_rodadas <= app.RODADA_MAXIMA: parser.error(f"--rodadas deve ficar entre 1 e {app.RODADA_MAXIMA}")
+                resultados += rodar(app, n_times, n_rodadas, args.repeticoes, pasta)
+
+    relatorio = {
+        "ambiente": {"python": platform.python_version(), "pandas": pd.__version__, "plataforma": platform.platform()},
+        "resultados": resultados,
+    }
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f: f.write(texto + "\n")
+    else:
+        sys.stdout.write(texto + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Teste de carga do app inteiro: N sessoes de visitante e de admin rodando app_cartola.py em paralelo pelo AppTest
+do Streamlit, contra a planilha e a API falsas (planilha_fake.py) com latencia configuravel.
+
+Uso:
+    python carga_cartola.py                                       # 10 visitantes, 1 admin, 5 reruns, 50 ms de latencia
+    python carga_cartola.py --visitantes 40 --admins 2 --reruns 10 --latencia 0.2 --times 200 --rodadas 38
+    python carga_cartola.py --admins 2 --gravar --saida carga.json   # cada rerun de admin antes grava um Pago
+
+Todas as sessoes compartilham o processo, como num servidor Streamlit de verdade: mesmo espelho SQLite, mesmas
+visoes derivadas e a mesma thread de sincronia. O JSON traz p50/p95/p99 da latencia de rerun (geral, por tipo e
+por sessao) e as chamadas ao backend por sessao; "sincronia-planilha" e a thread de fundo.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import numpy as np
+import streamlit as st
+import streamlit.logger
+from streamlit import config
+from streamlit.runtime.secrets import Secrets
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest, app_test
+
+import cartola_core
+import planilha_fake
+from bench_cartola import usar_backends
+
+ARQUIVO_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app_cartola.py")
+SENHA = "carga"
+
+SEGREDOS = {"cartola": {"senha_admin": SENHA, "refresh_token": "r" * 64}}
+
+
+def preparar_apptest_paralelo():
+    """O AppTest foi feito para uma sessao por vez: cada run liga e desliga o modo de teste global e troca o
+    st.secrets do processo. Aqui o modo fica ligado, os segredos ficam fixos e so a compilacao do script e
+    serializada (o ast.parse do CPython 3.11 quebra com compilacoes simultaneas)."""
+    config.set_option("global.appTest", True)
+    app_test.patch_config_options = lambda opcoes: contextlib.nullcontext()
+    st.secrets = Secrets()
+    st.secrets._secrets = SEGREDOS
+    trava = threading.Lock()
+    original = ScriptCache.get_bytecode
+    def get_bytecode(self, caminho):
+        with trava: return original(self, caminho)
+    ScriptCache.get_bytecode = get_bytecode
+
+
+def origem_da_chamada():
+    """Rotulo de quem fez a chamada ao backend: a sessao (vem na query string do AppTest) ou o nome da thread."""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx:
+        sessao = parse_qs(ctx.query_string).get("sessao")
+        if sessao: return sessao[0]
+    return threading.current_thread().name
+
+
+def percentis(tempos):
+    if not tempos: return {}
+    p50, p95, p99 = np.percentile(tempos, [50, 95, 99])
+    return {"n": len(tempos), "p50_ms": round(p50, 1), "p95_ms": round(p95, 1), "p99_ms": round(p99, 1), "max_ms": round(max(tempos), 1)}
+
+
+def gravar_um_pago():
+    """O que o botao Salvar Alteracoes do Resumo faz com uma celula: inverte o Pago de uma cobranca e grava."""
+    df, _, versao = cartola_core.carregar_dados_versionados()
+    cobrancas = df.index[df["Valor"] > 0]
+    if cobrancas.empty: return
+    linha = random.choice(list(cobrancas))
+    novo = df.copy()
+    novo.loc[linha, "Pago"] = not bool(df.at[linha, "Pago"])
+    cartola_core.salvar_dados(novo, df)
+    cartola_core.propagar_pagamentos(versao, df, novo.loc[[linha], "Pago"])
+
+
+def rodar_sessao(nome, admin, reruns, gravar, inicio, timeout):
+    threading.current_thread().name = nome  # chamadas feitas fora do script (gravacoes) contam para a sessao
+    at = AppTest.from_file(ARQUIVO_APP, default_timeout=timeout)
+    at.secrets.update(SEGREDOS)
+    at.query_params["sessao"] = nome
+    tempos, erros = [], []
+    inicio.wait()
+    for i in range(reruns):
+        if admin and gravar and i > 0: gravar_um_pago()
+        t0 = time.perf_counter()
+        if admin and i == 0: at.run(); at.text_input(key="senha_input").set_value(SENHA).run()  # login conta como um rerun so
+        else: at.run()
+        tempos.append((time.perf_counter() - t0) * 1000)
+        erros += [str(e.value) for e in at.exception]
+    return {"sessao": nome, "tipo": "admin" if admin else "visitante", "latencia": percentis(tempos), "tempos_ms": [round(t, 1) for t in tempos], "erros": erros}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--visitantes", type=int, default=10)
+    parser.add_argument("--admins", type=int, default=1)
+    parser.add_argument("--reruns", type=int, default=5, help="reruns por sessao (o primeiro de cada sessao e a carga da pagina)")
+    parser.add_argument("--latencia", type=float, default=0.05, help="segundos por chamada a planilha/API falsas")
+    parser.add_argument("--times", type=int, default=200)
+    parser.add_argument("--rodadas", type=int, default=19)
+    parser.add_argument("--gravar", action="store_true", help="admins gravam um Pago antes de cada rerun")
+    parser.add_argument("--timeout", type=float, default=120, help="segundos maximos por rerun")
+    parser.add_argument("--saida", help="arquivo JSON de saida (padrao: stdout)")
+    args = parser.parse_args(argv)
+
+    streamlit.logger.set_log_level("error")
+    preparar_apptest_paralelo()
+    grade = planilha_fake.gerar_livro_caixa(cartola_core.COLUNAS_ESPERADAS, args.times, args.rodadas, cartola_core.PCT_PAGANTES, cartola_core.VALOR_RODADA)
+    planilha = planilha_fake.planilha_com_livro(grade, args.latencia)
+    sessao_http = planilha_fake.SessaoCartolaFake(args.times, args.latencia)
+    planilha.contador.origem = sessao_http.contador.origem = origem_da_chamada
+
+    sessoes = [(f"admin-{i}", True) for i in range(args.admins)] + [(f"visitante-{i}", False) for i in range(args.visitantes)]
+    inicio = threading.Barrier(len(sessoes))
+    with tempfile.TemporaryDirectory() as pasta:
+        usar_backends(cartola_core, planilha, sessao_http, pasta)
+        cartola_core._cache_visoes.clear()
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(sessoes)) as pool:
+            resultados = list(pool.map(lambda s: rodar_sessao(s[0], s[1], args.reruns, args.gravar, inicio, args.timeout), sessoes))
+        duracao = time.perf_counter() - t0
+
+    por_origem = {o: dict(c) for o, c in planilha.contador.por_origem.items()}
+    for o, c in sessao_http.contador.por_origem.items(): por_origem.setdefault(o, {}).update({f"api.{k}": v for k, v in c.items()})
+    for r in resultados: r["chamadas_backend"] = por_origem.pop(r["sessao"], {})
+    todos = [t for r in resultados for t in r["tempos_ms"]]
+    relatorio = {
+        "ambiente": {"python": platform.python_version(), "plataforma": platform.platform(), "cpus": os.cpu_count()},
+        "parametros": vars(args),
+        "geral": {
+            "latencia": percentis(todos),
+            "cargas_de_pagina": percentis([r["tempos_ms"][0] for r in resultados]),
+            "reruns_seguintes": percentis([t for r in resultados for t in r["tempos_ms"][1:]]),
+            "reruns_por_segundo": round(len(todos) / duracao, 2),
+            "duracao_s": round(duracao, 2),
+            "chamadas_planilha": dict(planilha.contador.chamadas),
+            "chamadas_api": dict(sessao_http.contador.chamadas),
+            "erros": sum(len(r["erros"]) for r in resultados),
+        },
+        "por_tipo": {tipo: percentis([t for r in resultados if r["tipo"] == tipo for t in r["tempos_ms"]]) for tipo in ("visitante", "admin")},
+        "chamadas_outras_origens": por_origem,
+        "sessoes": resultados,
+    }
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f: f.write(texto + "\n")
+    else:
+        sys.stdout.write(texto + "\n")
+
+
+if __name__ == "__main__":
+    main()
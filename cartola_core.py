@@ -0,0 +1,1482 @@
+"""Nucleo do Gestor Cartola, sem interface: livro-caixa, espelho local, Google Sheets, API do Cartola e calculos.
+
+Usado pelo app Streamlit (app_cartola.py) e pela linha de comando (cartola_gestor.py). Importar este modulo nao
+toca no Streamlit nem na rede; gspread, oauth2client e requests so sao carregados na primeira conexao.
+"""
+import pandas as pd
+import numpy as np
+import os
+import re
+import sys
+import json
+import csv
+import hashlib
+import logging
+import sqlite3
+import tomllib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+import functools
+import threading
+import time
+
+# --- 1. CONFIGURAÇÕES ---
+VALOR_RODADA = 7.00
+LIMITE_MAX_PAGAMENTOS = 10
+PCT_PAGANTES = 0.25
+SLUG_LIGA_PADRAO = "os-pia-do-cartola"
+NOME_PLANILHA_GOOGLE = "Controle_Cartola_2026"
+NOME_ABA_DADOS = "Dados"
+NOME_ABA_CONFIG = "Config"
+TOTAL_RODADAS_TURNO = 19
+NOME_ABA_PERIODO = "Periodo"
+NOME_ABA_ACUMULADO = "Acumulado"  # cobrancas e pago por time dos turnos ja arquivados
+PREFIXO_ABA_ARQUIVO = "Arquivo T"  # uma aba por turno arquivado: "Arquivo T01", "Arquivo T02"...
+COLUNAS_ACUMULADO = ["Time", "Cobranças", "Pago"]
+PERIODO_INICIO_PADRAO = 1
+PERIODO_FIM_PADRAO = 19
+RODADA_MAXIMA = 380
+ARQUIVO_ESPELHO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "espelho_cartola.sqlite")
+INTERVALO_SINCRONIA = 300  # segundos entre puxadas completas de seguranca (edicoes feitas a mao na planilha nao mudam a revisao)
+INTERVALO_REVISAO = 10  # segundos entre consultas a celula de revisao (1 chamada; a planilha inteira so e puxada quando ela muda)
+CELULA_REVISAO = "B2"  # na aba Config; toda gravacao do app carimba uma revisao nova
+CELULA_ARQUIVADO = "C2"  # na aba Config: ultima rodada arquivada (vazio ou 0 = nada arquivado)
+COLUNAS_CONFIG = 3  # Config!A1:C2: token, revisao e ultima rodada arquivada
+TIMEOUT_HTTP = 15  # segundos por requisicao
+TENTATIVAS_HTTP = 4
+MAX_LIGAS_PARALELAS = 4
+MAX_REQUISICOES_HISTORICO = 8  # consultas simultaneas a API na busca de historico
+URL_API_CARTOLA = "https://api.cartola.globo.com"
+PASTA_CACHE_API = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_api_cartola")
+INTERVALO_MONITOR_RANKING = 60  # segundos entre consultas as ligas monitoradas com a rodada em andamento
+INTERVALO_MONITOR_MERCADO = 300  # segundos entre consultas ao status do mercado fora da rodada
+STATUS_MERCADO_AO_VIVO = 2  # status_mercado da API: 1 aberto, 2 fechado (rodada em andamento)
+COTA_SHEETS_POR_MINUTO = 60  # cota padrao de requisicoes por minuto por usuario da API do Sheets
+MAX_ETAPAS_TELEMETRIA = 2000
+MAX_VISOES_EM_CACHE = 8
+MARGEM_RENOVACAO_TOKEN = 60  # segundos antes do vencimento em que o access token ja e renovado
+
+COLUNAS_ESPERADAS = ["Data", "Rodada", "Time", "Valor", "Pago", "Motivo", "Posição"]
+VALORES_PAGO = ["TRUE", "VERDADEIRO", "SIM", "1"]
+COLUNA_LINHA = "_linha"  # linha de origem na aba Dados (habilita a gravacao incremental)
+COLUNA_DATA_TEXTO = "_data_texto"  # Data como veio da planilha quando nao estava em ISO (e regravada assim)
+MAPA_COLUNAS_RANKING = {"Pontuação": "Posição", "Pts": "Posição", "Pontos": "Posição", "Pos": "Posição", "Nome": "Time", "Participante": "Time", "Equipe": "Time", "Cartoleiro": "Time"}
+PADRAO_RODADA = re.compile(r"(?:rodada|rod|r)?\s*(\d+)", re.IGNORECASE)  # "5", "R5", "Rodada 5": aba ou coluna de uma rodada
+LINHAS_POR_LOTE_IMPORTACAO = 50_000
+ARQUIVOS_SEGREDOS = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml"),
+    os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"),
+]
+
+# --- 2. INFRAESTRUTURA (caches do processo, segredos e avisos) ---
+log = logging.getLogger("cartola")
+
+def recurso_do_processo(funcao=None, max_entradas=None):
+    """Equivalente headless do st.cache_resource: um resultado por argumentos, compartilhado por todo o processo
+    (sobrevive aos reruns do Streamlit, que reexecutam so o script principal). `.clear()` esvazia o cache."""
+    def decorador(funcao):
+        cache, trava = OrderedDict(), threading.Lock()
+        @functools.wraps(funcao)
+        def envolvida(*args):
+            with trava:
+                if args in cache:
+                    cache.move_to_end(args)
+                    return cache[args]
+                cache[args] = valor = funcao(*args)
+                if max_entradas and len(cache) > max_entradas: cache.popitem(last=False)
+                return valor
+        envolvida.clear = cache.clear
+        return envolvida
+    return decorador(funcao) if funcao else decorador
+
+_segredos = None
+_avisos = None
+
+def configurar(segredos=None, avisos=None):
+    """Injeta a origem dos segredos (ex.: st.secrets) e a funcao que mostra avisos (nivel, mensagem) ao usuario."""
+    global _segredos, _avisos
+    if segredos is not None: _segredos = segredos
+    if avisos is not None: _avisos = avisos
+
+def segredos():
+    """Segredos configurados; fora do Streamlit, le o mesmo secrets.toml (pasta do app ou ~/.streamlit)."""
+    global _segredos
+    if _segredos is None:
+        _segredos = {}
+        for caminho in reversed(ARQUIVOS_SEGREDOS):
+            if os.path.exists(caminho):
+                with open(caminho, "rb") as f: _segredos.update(tomllib.load(f))
+    return _segredos
+
+def avisar(nivel, mensagem):
+    """nivel: "error" ou "warning" (os nomes do st.error/st.warning)."""
+    if _avisos: _avisos(nivel, mensagem)
+    else: log.log(logging.ERROR if nivel == "error" else logging.WARNING, mensagem)
+
+# --- 3. TELEMETRIA ---
+@recurso_do_processo
+def _telemetria():
+    """Etapas cronometradas e chamadas ao Google Sheets, compartilhadas por todas as sessoes do processo."""
+    return {"lock": threading.Lock(), "etapas": deque(maxlen=MAX_ETAPAS_TELEMETRIA), "chamadas_sheets": deque()}
+
+def sessao_atual():
+    """Sessao do Streamlit que esta rodando (se houver); fora dele, o nome da thread."""
+    if "streamlit" in sys.modules:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+        if ctx: return ctx.session_id
+    return threading.current_thread().name
+
+@contextmanager
+def medir_etapa(nome):
+    inicio = time.time()
+    t0 = time.perf_counter()
+    try: yield
+    finally:
+        tel = _telemetria()
+        with tel["lock"]:
+            tel["etapas"].append({"inicio": inicio, "etapa": nome, "ms": round((time.perf_counter() - t0) * 1000, 2), "sessao": sessao_atual()})
+
+def cronometrado(nome):
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with medir_etapa(nome): return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+def registrar_chamada_sheets():
+    tel = _telemetria()
+    agora = time.time()
+    with tel["lock"]:
+        tel["chamadas_sheets"].append(agora)
+        while tel["chamadas_sheets"] and tel["chamadas_sheets"][0] < agora - 60: tel["chamadas_sheets"].popleft()
+
+def chamadas_sheets_ultimo_minuto():
+    tel = _telemetria()
+    with tel["lock"]: return sum(1 for t in tel["chamadas_sheets"] if t >= time.time() - 60)
+
+def etapas_medidas():
+    """Copia das etapas registradas (inicio, etapa, ms, sessao), da mais antiga para a mais recente."""
+    tel = _telemetria()
+    with tel["lock"]: return list(tel["etapas"])
+
+# --- 4. CONEXÃO GOOGLE SHEETS ---
+@recurso_do_processo
+def _abrir_planilha():
+    """Autoriza uma unica vez por processo; todas as abas reaproveitam esta sessao."""
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    class _HTTPClientContado(gspread.http_client.HTTPClient):
+        """Cliente HTTP do gspread que conta cada requisicao a API do Sheets (para comparar com a cota)."""
+        def request(self, *args, **kwargs):
+            registrar_chamada_sheets()
+            return super().request(*args, **kwargs)
+
+    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+    if "gcp_service_account" in segredos():
+        creds = ServiceAccountCredentials.from_json_keyfile_dict(dict(segredos()["gcp_service_account"]), scope)
+    else:
+        creds = ServiceAccountCredentials.from_json_keyfile_name("credentials.json", scope)
+    return gspread.authorize(creds, http_client=_HTTPClientContado).open(NOME_PLANILHA_GOOGLE)
+
+@recurso_do_processo
+def _abrir_aba(nome):
+    return _abrir_planilha().worksheet(nome)
+
+def conectar_planilha():
+    try: return _abrir_planilha()
+    except: return None
+
+def conectar_gsheets():
+    try: return _abrir_aba(NOME_ABA_DADOS)
+    except: return None
+
+def conectar_planilha_config():
+    try: return _abrir_aba(NOME_ABA_CONFIG)
+    except: return None
+
+def conectar_planilha_periodo():
+    from gspread.exceptions import WorksheetNotFound
+    try:
+        return _abrir_aba(NOME_ABA_PERIODO)
+    except WorksheetNotFound:
+        try:
+            ws = _abrir_planilha().add_worksheet(title=NOME_ABA_PERIODO, rows=10, cols=5)
+            ws.update([["Inicio", "fim"], [PERIODO_INICIO_PADRAO, PERIODO_FIM_PADRAO]], "A1:B2")
+            return ws
+        except: return None
+    except: return None
+
+def ler_planilha():
+    """Le Dados, Config!A1:C2 (token, revisao e ultima rodada arquivada), Periodo!A1:B2 e Acumulado numa unica
+    chamada values_batch_get. Os turnos arquivados ficam fora: o custo nao cresce com o historico."""
+    planilha = conectar_planilha()
+    if not planilha: return None
+    from gspread.exceptions import APIError
+    faixas = {
+        NOME_ABA_DADOS: f"'{NOME_ABA_DADOS}'",
+        NOME_ABA_CONFIG: f"'{NOME_ABA_CONFIG}'!A1:C2",
+        NOME_ABA_PERIODO: f"'{NOME_ABA_PERIODO}'!A1:B2",
+        NOME_ABA_ACUMULADO: f"'{NOME_ABA_ACUMULADO}'",
+    }
+    try:
+        resp = planilha.values_batch_get(list(faixas.values()))
+    except APIError:
+        # Alguma aba ainda nao existe ou e menor que a faixa lida (o batch falha inteiro): cria ou aumenta e tenta de novo
+        existentes = {ws.title: ws for ws in planilha.worksheets()}
+        config = existentes.get(NOME_ABA_CONFIG)
+        if config is None: planilha.add_worksheet(title=NOME_ABA_CONFIG, rows=10, cols=COLUNAS_CONFIG)
+        elif config.col_count < COLUNAS_CONFIG: config.resize(cols=COLUNAS_CONFIG)
+        if NOME_ABA_PERIODO not in existentes: conectar_planilha_periodo()
+        if NOME_ABA_ACUMULADO not in existentes: planilha.add_worksheet(title=NOME_ABA_ACUMULADO, rows=100, cols=len(COLUNAS_ACUMULADO)).update([COLUNAS_ACUMULADO])
+        resp = planilha.values_batch_get(list(faixas.values()))
+    return {nome: vr.get("values", []) for nome, vr in zip(faixas, resp.get("valueRanges", []))}
+
+def aplicar_esquema(df):
+    """Tipa o livro-caixa de forma compacta e vetorizada: Data datetime, Rodada int16, Time/Motivo category,
+    Valor/Posição float32 e Pago bool. Colunas ausentes sao criadas; colunas extras (ex.: _linha) sao mantidas."""
+    df = df.reindex(columns=COLUNAS_ESPERADAS + [c for c in df.columns if c not in COLUNAS_ESPERADAS])
+    texto_data = df["Data"].astype("string").str.strip()
+    # ISO (inclui Timestamps ja convertidos, que viram "AAAA-MM-DD HH:MM:SS"); o resto e lido como dd/mm/aaaa
+    data = pd.to_datetime(texto_data, errors="coerce", format="ISO8601")
+    outros = data.isna() & texto_data.fillna("").ne("")
+    if outros.any(): data[outros] = pd.to_datetime(texto_data[outros], errors="coerce", dayfirst=True, format="mixed")
+    # O texto original das datas fora do ISO (ambiguas ou ilegiveis) e guardado: serializar_dados o devolve como veio
+    if outros.any() or COLUNA_DATA_TEXTO in df.columns:
+        texto = texto_data.where(outros).astype(object)
+        if COLUNA_DATA_TEXTO in df.columns: texto = texto.where(texto.notna(), df[COLUNA_DATA_TEXTO])
+        df = df.assign(**{COLUNA_DATA_TEXTO: texto.where(texto.notna(), None)})
+
+    valor = df["Valor"]
+    if not pd.api.types.is_numeric_dtype(valor):
+        valor = valor.astype(str).str.replace("R$", "", regex=False).str.replace(",", ".", regex=False)
+
+    pago = df["Pago"]
+    if pd.api.types.is_bool_dtype(pago): pass
+    elif pd.api.types.is_numeric_dtype(pago): pago = pago.fillna(0) != 0
+    else: pago = pago.astype(str).str.strip().str.upper().isin(VALORES_PAGO)
+
+    return df.assign(**{
+        "Data": data,
+        "Rodada": pd.to_numeric(df["Rodada"], errors="coerce").fillna(0).astype("int16"),
+        "Time": df["Time"].astype("category"),
+        "Valor": pd.to_numeric(valor, errors="coerce").fillna(0.0).astype("float32"),
+        "Pago": pago.astype(bool),
+        "Motivo": df["Motivo"].astype("category"),
+        "Posição": pd.to_numeric(df["Posição"], errors="coerce").astype("float32"),
+    })
+
+def montar_dados(valores):
+    """Converte a grade crua da aba Dados (lista de linhas) no DataFrame do livro-caixa."""
+    try:
+        if len(valores) < 2:
+            return pd.DataFrame(columns=COLUNAS_ESPERADAS), "Vazio"
+        
+        cab = [str(c).strip() for c in valores[0]]
+        df = pd.DataFrame(valores[1:]).reindex(columns=range(len(cab)))
+        df.columns = cab
+        # So da para mapear linha -> celula quando o cabecalho esta no layout que o app grava
+        layout_ok = cab == COLUNAS_ESPERADAS
+        df[COLUNA_LINHA] = (df.index + 2) if layout_ok else None
+
+        if "Pontos" in df.columns and "Posição" not in df.columns:
+            df.rename(columns={"Pontos": "Posição"}, inplace=True)
+
+        # Cabecalhos repetidos no meio da aba (coladas de outras planilhas)
+        repetido = np.zeros(len(df), dtype=bool)
+        for col in ("Time", "Valor"):
+            if col in df.columns: repetido |= (df[col].astype(str) == col).to_numpy()
+        df = df[~repetido]
+
+        return aplicar_esquema(df), "Sucesso"
+    except Exception as e:
+        return pd.DataFrame(columns=COLUNAS_ESPERADAS), f"Erro Leitura: {e}"
+
+# --- 4.1 ESPELHO LOCAL (SQLite) ---
+# Todas as abas leem do espelho; a planilha so e tocada pela sincronia e pelas gravacoes.
+_trava_espelho = threading.RLock()
+
+def _conectar_espelho():
+    con = sqlite3.connect(ARQUIVO_ESPELHO, timeout=30)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT)")
+    con.execute('CREATE TABLE IF NOT EXISTS dados ("Data" TEXT, "Rodada" INTEGER, "Time" TEXT, "Valor" REAL, "Pago" INTEGER, "Motivo" TEXT, "Posição", "_linha" INTEGER)')
+    return con
+
+def ler_meta(chave, padrao=None):
+    con = _conectar_espelho()
+    try: linha = con.execute("SELECT valor FROM meta WHERE chave = ?", (chave,)).fetchone()
+    finally: con.close()
+    return linha[0] if linha else padrao
+
+def gravar_meta(**valores):
+    with _trava_espelho:
+        con = _conectar_espelho()
+        try:
+            with con: con.executemany("INSERT OR REPLACE INTO meta (chave, valor) VALUES (?, ?)", [(k, str(v)) for k, v in valores.items()])
+        finally: con.close()
+
+def ler_aba_espelho(nome):
+    return json.loads(ler_meta(f"aba_{nome}") or "[]")
+
+def _ler_dados_espelho():
+    con = _conectar_espelho()
+    try: df = pd.read_sql_query("SELECT * FROM dados", con)
+    finally: con.close()
+    return aplicar_esquema(df)
+
+def _gravar_espelho(df, versao, status, pendente=False, abas=None):
+    """Substitui o livro-caixa do espelho numa unica transacao (leitores nunca veem a tabela pela metade)."""
+    colunas = COLUNAS_ESPERADAS + [COLUNA_LINHA]
+    linhas = serializar_dados(df).assign(**{COLUNA_LINHA: df[COLUNA_LINHA] if COLUNA_LINHA in df.columns else None}).astype(object)
+    linhas = linhas.where(linhas.notna(), None).values.tolist()
+    meta = {"versao": versao, "status": status, "pendente": int(pendente)}
+    for nome, valores in (abas or {}).items(): meta[f"aba_{nome}"] = json.dumps(valores)
+    with _trava_espelho:
+        con = _conectar_espelho()
+        try:
+            with con:
+                con.execute("DELETE FROM dados")
+                con.executemany(f"INSERT INTO dados VALUES ({', '.join('?' * len(colunas))})", linhas)
+                con.executemany("INSERT OR REPLACE INTO meta (chave, valor) VALUES (?, ?)", [(k, str(v)) for k, v in meta.items()])
+        finally: con.close()
+
+def _chaves_livro(df):
+    return pd.MultiIndex.from_arrays([df["Time"].astype(str), df["Rodada"].astype(int)], names=["Time", "Rodada"])
+
+def _mesclar_alteracoes(base, local, remoto):
+    """Merge de tres vias por (Time, Rodada) entre livros-caixa serializados: o que `local` mudou em relacao a `base`
+    (linhas alteradas, novas e removidas) e aplicado sobre `remoto`; o resto de `remoto` (gravacoes de outros) fica."""
+    b = base.set_axis(_chaves_livro(base))
+    b = b[~b.index.duplicated(keep="last")]
+    l = local.set_axis(_chaves_livro(local))
+    l = l[~l.index.duplicated(keep="last")]
+    comuns = l.index.intersection(b.index)
+    alteradas = comuns[(l.loc[comuns].astype(str) != b.loc[comuns].astype(str)).any(axis=1).to_numpy()]
+    novas = l.index.difference(b.index)
+
+    r = remoto.reset_index(drop=True)
+    r = r[~_chaves_livro(r).isin(b.index.difference(l.index))].reset_index(drop=True).astype(object)
+    chaves = _chaves_livro(r)
+    trocar = chaves.isin(alteradas.append(novas))
+    r.loc[trocar, :] = l.loc[chaves[trocar], r.columns].to_numpy()
+    return pd.concat([r, l.loc[novas.difference(chaves), r.columns]], ignore_index=True)
+
+def _livro_da_planilha():
+    """Aba Dados atual, serializada (uma leitura em lote). ConnectionError se a planilha nao respondeu."""
+    abas = ler_planilha()
+    if abas is None: raise ConnectionError(f"aba {NOME_ABA_DADOS} indisponivel")
+    df, status = montar_dados(abas.get(NOME_ABA_DADOS, []))
+    if status not in ("Sucesso", "Vazio"): raise ConnectionError(status)
+    return serializar_dados(df).reset_index(drop=True)
+
+def _enviar_pendente(sheet):
+    """Envia a gravacao feita com a planilha fora do ar. Se a planilha mudou desde a ultima leitura (revisao nova ou
+    conteudo diferente, ex.: outra sessao ou edicao a mao), nao a sobrescreve: reaplica so o que mudou localmente."""
+    local = serializar_dados(_ler_dados_espelho()).reset_index(drop=True)
+    remoto = _livro_da_planilha()
+    base = ler_meta("base_pendente")
+    mudou = ler_revisao_planilha() != ler_meta("revisao", "")
+    if base:
+        base = pd.DataFrame(json.loads(base), columns=COLUNAS_ESPERADAS)
+        if mudou or not remoto.astype(str).equals(base.astype(str)):
+            log.warning("A planilha mudou durante a gravacao pendente: reaplicando so as alteracoes locais.")
+            local = _mesclar_alteracoes(base, local, remoto)
+    elif mudou:
+        # Pendencia sem a leitura de base (gravada por uma versao antiga): sem como mesclar, a planilha prevalece
+        log.error("A planilha mudou durante a gravacao pendente e nao ha base para mesclar: a alteracao local foi guardada em pendente_descartado.")
+        gravar_meta(pendente_descartado=json.dumps(local.astype(object).values.tolist()))
+        return
+    _reescrever_planilha(sheet, local)
+    marcar_revisao()
+
+@cronometrado("sincronizar_espelho")
+def sincronizar_espelho():
+    """Envia gravacoes pendentes e puxa a planilha para o espelho.
+    Retorna False se a planilha nao respondeu ou se o espelho nao pode ser gravado (ex.: SQLite travado)."""
+    with _trava_espelho:
+        try:
+            if ler_meta("pendente") == "1":
+                sheet = conectar_gsheets()
+                if not sheet: return False
+                _enviar_pendente(sheet)
+                gravar_meta(base_pendente="")
+            abas = ler_planilha()
+            if abas is None: return False
+        except Exception: return False
+        versao = hashlib.sha1(json.dumps(abas, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        try:
+            if versao != ler_meta("versao") or ler_meta("pendente") == "1":
+                df, status = montar_dados(abas.get(NOME_ABA_DADOS, []))
+                _gravar_espelho(df, versao, status, abas={k: v for k, v in abas.items() if k != NOME_ABA_DADOS})
+            config = abas.get(NOME_ABA_CONFIG, [])
+            revisao = config[1][1] if len(config) > 1 and len(config[1]) > 1 else ""
+            gravar_meta(sincronizado_em=int(time.time()), revisao=revisao)
+        except sqlite3.Error as e:
+            log.warning("Espelho local indisponivel: %s", e)
+            return False
+        return True
+
+def marcar_revisao():
+    """Carimba uma revisao nova em Config!B2 depois de gravar, para os outros processos notarem a mudanca."""
+    sheet_config = conectar_planilha_config()
+    if not sheet_config: return
+    try: sheet_config.update([["Revisao"], [str(time.time_ns())]], f"B1:{CELULA_REVISAO}")
+    except Exception: pass  # sem o carimbo os outros processos so veem a gravacao na puxada completa de seguranca
+
+def ler_revisao_planilha():
+    """Revisao atual na planilha (uma leitura de celula), "" se nunca carimbada, None se a planilha nao respondeu."""
+    sheet_config = conectar_planilha_config()
+    if not sheet_config: return None
+    try: return sheet_config.acell(CELULA_REVISAO).value or ""
+    except Exception: return None
+
+@cronometrado("atualizar_espelho")
+def atualizar_espelho(forcar=False):
+    """Sincroniza so se preciso: gravacao pendente, revisao da planilha diferente da do espelho, ou `forcar`.
+    Retorna False se a planilha nao respondeu."""
+    if forcar or ler_meta("pendente") == "1": return sincronizar_espelho()
+    revisao = ler_revisao_planilha()
+    if revisao is None: return False
+    return revisao == ler_meta("revisao") or sincronizar_espelho()
+
+def _laco_sincronia():
+    ultima_completa = time.time()
+    while True:
+        time.sleep(INTERVALO_REVISAO)
+        # Uma falha nao pode matar a thread: iniciar_sincronia nao a sobe de novo e o espelho ficaria parado
+        try:
+            completa = time.time() - ultima_completa >= INTERVALO_SINCRONIA
+            if atualizar_espelho(forcar=completa) and completa: ultima_completa = time.time()
+        except Exception as e: log.warning("Sincronia do espelho: %s", e)
+
+@recurso_do_processo
+def iniciar_sincronia():
+    """Sobe (uma vez por processo) a thread que mantem o espelho em dia com a planilha."""
+    t = threading.Thread(target=_laco_sincronia, name="sincronia-planilha", daemon=True)
+    t.start()
+    return t
+
+def _garantir_espelho():
+    # Primeira execucao no servidor: o espelho ainda esta vazio, entao a carga inicial e sincrona.
+    # Reconfere dentro da trava: com varias sessoes chegando juntas, so a primeira puxa a planilha.
+    if ler_meta("versao") is not None: return
+    with _trava_espelho:
+        if ler_meta("versao") is None: sincronizar_espelho()
+
+@cronometrado("carregar_periodo")
+def carregar_periodo():
+    """Le rodada de inicio (A2) e fim (B2) da aba Periodo, com validacao."""
+    inicio, fim = PERIODO_INICIO_PADRAO, PERIODO_FIM_PADRAO
+    try:
+        _garantir_espelho()
+        valores = ler_aba_espelho(NOME_ABA_PERIODO)
+        linha = valores[1] if len(valores) > 1 else []
+        v_ini = linha[0] if len(linha) > 0 else None
+        v_fim = linha[1] if len(linha) > 1 else None
+        if v_ini not in (None, ""): inicio = int(float(str(v_ini).strip().replace(",", ".")))
+        if v_fim not in (None, ""): fim = int(float(str(v_fim).strip().replace(",", ".")))
+    except: pass
+    inicio = max(1, min(inicio, RODADA_MAXIMA))
+    fim = max(1, min(fim, RODADA_MAXIMA))
+    if inicio > fim: inicio, fim = fim, inicio
+    return inicio, fim
+
+def salvar_periodo(inicio, fim):
+    ws = conectar_planilha_periodo()
+    if ws:
+        try:
+            valores = [["Inicio", "fim"], [int(inicio), int(fim)]]
+            ws.update(valores, "A1:B2")
+            marcar_revisao()
+            gravar_meta(**{f"aba_{NOME_ABA_PERIODO}": json.dumps(valores)})
+            return True
+        except Exception as e:
+            avisar("error", f"Erro ao salvar periodo na aba {NOME_ABA_PERIODO}: {e}")
+    return False
+
+def resetar_banco_dados():
+    sheet = conectar_gsheets()
+    if sheet:
+        sheet.clear()
+        sheet.append_row(COLUNAS_ESPERADAS)
+        _limpar_arquivo()
+        marcar_revisao()
+        sincronizar_espelho()  # atualiza o espelho apos resetar
+        return True
+    return False
+
+@cronometrado("carregar_dados")
+def carregar_dados_versionados():
+    """Como carregar_dados, mas devolve tambem a versao do espelho lida (chave das visoes derivadas)."""
+    try: _garantir_espelho()
+    except Exception as e: return pd.DataFrame(columns=COLUNAS_ESPERADAS), f"Erro Leitura: {e}", None
+    versao = ler_meta("versao")
+    if versao is None: return pd.DataFrame(columns=COLUNAS_ESPERADAS), "Erro Conexão", None
+    return (*_carregar_dados_versao(versao), versao)
+
+def carregar_dados():
+    df, status, _ = carregar_dados_versionados()
+    return df, status
+
+@recurso_do_processo(max_entradas=4)
+def _carregar_dados_versao(versao):
+    """Le o espelho uma vez por versao; a versao muda a cada sincronia com conteudo novo ou gravacao local.
+    O DataFrame devolvido e compartilhado entre chamadas: quem for alterar deve copiar antes."""
+    df = _ler_dados_espelho()
+    status = ler_meta("status", "Sucesso")
+    if df.empty: return pd.DataFrame(columns=COLUNAS_ESPERADAS), "Vazio" if status == "Sucesso" else status
+    return df, status
+
+def serializar_dados(df):
+    """Livro-caixa no formato gravado na aba Dados: passa pelo mesmo aplicar_esquema e sai em texto/numeros simples.
+    Datas que nao vieram em ISO voltam com o texto original, nunca apagadas nem reformatadas."""
+    tip = aplicar_esquema(df)
+    data = tip["Data"].dt.strftime("%Y-%m-%d").astype(object)
+    if COLUNA_DATA_TEXTO in tip.columns: data = data.where(tip[COLUNA_DATA_TEXTO].isna(), tip[COLUNA_DATA_TEXTO])
+    return pd.DataFrame({
+        "Data": data.fillna(""),
+        "Rodada": tip["Rodada"].astype(int),
+        "Time": tip["Time"].astype(object).where(tip["Time"].notna(), ""),
+        "Valor": tip["Valor"].astype(float).round(2),
+        "Pago": np.where(tip["Pago"], "TRUE", "FALSE"),
+        "Motivo": tip["Motivo"].astype(object).where(tip["Motivo"].notna(), ""),
+        "Posição": tip["Posição"].astype(float).round(2).astype(object).where(tip["Posição"].notna(), ""),
+    }, index=df.index)
+
+def _valor_celula(v):
+    return v.item() if hasattr(v, "item") else v
+
+def _reescrever_planilha(sheet, df_save):
+    """Regrava a aba inteira. Sobrescreve antes de limpar as sobras, entao uma falha no meio nunca deixa a aba vazia.
+    O update nao aumenta a grade da aba: se os dados nao cabem, ela e redimensionada antes."""
+    from gspread.utils import rowcol_to_a1
+    valores = [df_save.columns.values.tolist()] + df_save.values.tolist()
+    if sheet.row_count < len(valores) or sheet.col_count < len(df_save.columns):
+        sheet.resize(rows=max(sheet.row_count, len(valores)), cols=max(sheet.col_count, len(df_save.columns)))
+    sheet.update(valores)
+    sobras = []
+    if sheet.row_count > len(valores): sobras.append(f"{len(valores) + 1}:{sheet.row_count}")
+    if sheet.col_count > len(df_save.columns):
+        sobras.append(f"{rowcol_to_a1(1, len(df_save.columns) + 1)}:{rowcol_to_a1(len(valores), sheet.col_count)}")
+    if sobras: sheet.batch_clear(sobras)
+
+def _gravar_diferencas(sheet, df, df_base):
+    """Envia so o que mudou em relacao ao snapshot carregado: celulas alteradas, linhas removidas e linhas novas."""
+    from gspread.utils import rowcol_to_a1
+    linhas_base = pd.to_numeric(df_base[COLUNA_LINHA], errors="coerce")
+    linhas_novo = pd.to_numeric(df[COLUNA_LINHA], errors="coerce") if COLUNA_LINHA in df.columns else pd.Series(float("nan"), index=df.index)
+    antigo = serializar_dados(df_base).set_index(linhas_base.astype(int).values)
+    novo = serializar_dados(df)
+    conhecidas = linhas_novo.isin(antigo.index).values
+    mantidas = novo[conhecidas].set_index(linhas_novo[conhecidas].astype(int).values)
+    anexar = novo[~conhecidas]
+    remover = sorted(set(antigo.index) - set(mantidas.index), reverse=True)
+
+    # 1) celulas alteradas (antes de remover linhas, enquanto os numeros de linha ainda valem)
+    comp = antigo.loc[mantidas.index].astype(str) != mantidas.astype(str)
+    celulas = [
+        {"range": rowcol_to_a1(int(linha), COLUNAS_ESPERADAS.index(col) + 1), "values": [[_valor_celula(mantidas.at[linha, col])]]}
+        for linha, col in comp.stack().loc[lambda x: x].index
+    ]
+    if celulas: sheet.batch_update(celulas)
+
+    # 2) linhas removidas, de baixo para cima em blocos contiguos, numa unica requisicao
+    if remover:
+        blocos = []
+        for linha in remover:
+            if blocos and blocos[-1][0] == linha + 1: blocos[-1][0] = linha
+            else: blocos.append([linha, linha])
+        sheet.spreadsheet.batch_update({"requests": [
+            {"deleteDimension": {"range": {"sheetId": sheet.id, "dimension": "ROWS", "startIndex": ini - 1, "endIndex": fim}}}
+            for ini, fim in blocos
+        ]})
+
+    # 3) linhas novas no final
+    if not anexar.empty: sheet.append_rows(anexar.values.tolist())
+
+@cronometrado("salvar_dados")
+def salvar_dados(df, df_base=None):
+    """Grava o DataFrame na aba Dados e atualiza o espelho local.
+    Com `df_base` (o snapshot de carregar_dados) envia so as diferencas; sem ele, ou se o snapshot
+    nao tiver o mapa de linhas, cai na regravacao completa. Se a revisao em Config!B2 andou desde o snapshot,
+    reaplica as diferencas sobre a aba atual e regrava tudo. Retorna False se so deu para gravar no espelho."""
+    sheet = conectar_gsheets()
+    incremental = (
+        df_base is not None and not df_base.empty and COLUNA_LINHA in df_base.columns
+        and pd.to_numeric(df_base[COLUNA_LINHA], errors="coerce").notna().all()
+    )
+    try:
+        if not sheet: raise ConnectionError(f"aba {NOME_ABA_DADOS} indisponivel")
+        if incremental and ler_revisao_planilha() != ler_meta("revisao", ""):
+            # A planilha mudou depois do snapshot: os numeros de linha podem apontar para outras linhas.
+            # Reaplica as alteracoes sobre a aba atual e regrava tudo
+            df = _mesclar_alteracoes(serializar_dados(df_base), serializar_dados(df), _livro_da_planilha())
+            incremental = False
+        try:
+            if incremental: _gravar_diferencas(sheet, df, df_base)
+            else: _reescrever_planilha(sheet, serializar_dados(df))
+        except Exception:
+            if not incremental: raise
+            _reescrever_planilha(sheet, serializar_dados(df))
+        marcar_revisao()
+    except Exception:
+        # Planilha fora do ar: grava no espelho e a thread de sincronia envia quando ela voltar. A ultima leitura
+        # da planilha fica guardada (so na primeira pendencia) para o envio reaplicar so o que mudou desde ela
+        with _trava_espelho:
+            if ler_meta("pendente") != "1": gravar_meta(base_pendente=json.dumps(serializar_dados(_ler_dados_espelho()).astype(object).values.tolist()))
+            _gravar_espelho(df.assign(**{COLUNA_LINHA: None}), f"local-{time.time_ns()}", "Sucesso", pendente=True)
+        avisar("warning", "⚠️ Google Sheets indisponível: alteração salva localmente e será enviada na próxima sincronização.")
+        return False
+    if not sincronizar_espelho():
+        # Gravou na planilha mas nao conseguiu reler: guarda o resultado sem o mapa de linhas (proxima gravacao regrava tudo)
+        _gravar_espelho(df.assign(**{COLUNA_LINHA: None}), f"local-{time.time_ns()}", "Sucesso")
+    return True
+
+# --- 4.2 TURNOS ARQUIVADOS (a aba Dados guarda so o turno ativo) ---
+def turno_da_rodada(rodada):
+    return (int(rodada) - 1) // TOTAL_RODADAS_TURNO + 1
+
+def _nome_aba_arquivo(turno):
+    return f"{PREFIXO_ABA_ARQUIVO}{turno:02d}"
+
+def _numeros(serie):
+    return pd.to_numeric(serie.astype(str).str.replace("R$", "", regex=False).str.replace(",", ".", regex=False), errors="coerce").fillna(0)
+
+def _montar_acumulado(valores):
+    """Grade crua da aba Acumulado -> DataFrame indexado por Time com Cobranças e Pago (R$)."""
+    df = pd.DataFrame(valores[1:]).reindex(columns=range(len(COLUNAS_ACUMULADO)))
+    df.columns = COLUNAS_ACUMULADO
+    df = df[df["Time"].notna() & (df["Time"].astype(str).str.strip() != "")]
+    return pd.DataFrame({"Cobranças": _numeros(df["Cobranças"]).astype(int).values, "Pago": _numeros(df["Pago"]).astype(float).values},
+                        index=pd.Index(df["Time"].astype(str).str.strip(), name="Time"))
+
+def acumulado_arquivado():
+    """O que os turnos arquivados deixaram, lido do espelho: (cobrancas por time, total pago, ultima rodada arquivada).
+    As cobrancas entram no LIMITE_MAX_PAGAMENTOS de calcular/recalcular_temporada; o pago, no placar de Pendências."""
+    acumulado, ate = _montar_acumulado([]), 0
+    try:
+        acumulado = _montar_acumulado(ler_aba_espelho(NOME_ABA_ACUMULADO))
+        config = ler_aba_espelho(NOME_ABA_CONFIG)
+        celula = str(config[1][2]).strip() if len(config) > 1 and len(config[1]) > 2 else ""
+        if celula: ate = int(float(celula.replace(",", ".")))
+    except: pass
+    return acumulado["Cobranças"], float(acumulado["Pago"].sum()), ate
+
+def linhas_arquivaveis(df_fin, rodada):
+    """Linhas que saem da aba Dados ao arquivar ate `rodada`: as ja quitadas ou sem cobranca.
+    Dividas em aberto ficam no turno ativo, onde continuam em Pendências e podem ser marcadas como pagas."""
+    if df_fin.empty: return df_fin
+    return df_fin[(df_fin["Rodada"] <= rodada) & (df_fin["Pago"].astype(bool) | (df_fin["Valor"] <= 0))]
+
+def _grades_arquivo(planilha, nomes):
+    """Grade crua de cada aba de arquivo em `nomes`, numa leitura em lote: {nome: valores}."""
+    if not nomes: return {}
+    resp = planilha.values_batch_get([f"'{n}'" for n in nomes])
+    return {n: vr.get("values", []) for n, vr in zip(nomes, resp.get("valueRanges", []))}
+
+def _e_cabecalho(linha):
+    return [str(c).strip() for c in linha] == COLUNAS_ESPERADAS
+
+def _livro_arquivado(valores):
+    """Grade de uma aba de arquivo -> livro-caixa. Aceita aba sem cabecalho (esvaziada por um reset antigo)."""
+    linhas = [l for l in valores if not _e_cabecalho(l)]
+    return montar_dados([COLUNAS_ESPERADAS] + linhas)[0].drop(columns=COLUNA_LINHA, errors="ignore")
+
+@cronometrado("arquivar_turnos")
+def arquivar_ate(rodada):
+    """Move as linhas_arquivaveis ate `rodada` para as abas de arquivo (uma por turno), recalcula o Acumulado a partir
+    delas e regrava a aba Dados so com o que sobrou. Retorna quantas linhas sairam.
+    Pode ser repetido depois de uma falha no meio: linhas ja arquivadas (mesmo Time e Rodada) nao entram de novo,
+    o Acumulado nunca e somado e a ultima rodada arquivada (Config!C2) so e carimbada no fim.
+    ValueError se `rodada` nao passa da ultima arquivada; ConnectionError se a planilha nao respondeu."""
+    if not atualizar_espelho(): raise ConnectionError("Google Sheets indisponível: nada foi arquivado.")
+    df, status = carregar_dados()
+    if status not in ("Sucesso", "Vazio"): raise ConnectionError(f"Falha ao ler o livro-caixa: {status}")
+    _, _, ate = acumulado_arquivado()
+    if rodada <= ate: raise ValueError(f"As rodadas até {ate} já estão arquivadas.")
+    planilha, sheet, sheet_config = conectar_planilha(), conectar_gsheets(), conectar_planilha_config()
+    if not (planilha and sheet and sheet_config): raise ConnectionError("Google Sheets indisponível: nada foi arquivado.")
+
+    mover = linhas_arquivaveis(df, rodada)
+    abas = {ws.title: ws for ws in planilha.worksheets()}
+    grades = _grades_arquivo(planilha, sorted(n for n in abas if n.startswith(PREFIXO_ABA_ARQUIVO)))
+    arquivado = {n: _livro_arquivado(valores) for n, valores in grades.items()}
+    # 1) arquivo (so acrescenta o que ainda nao esta la), 2) Acumulado, 3) aba Dados sem as linhas movidas, 4) Config!C2
+    for turno, bloco in serializar_dados(mover).groupby(mover["Rodada"].astype(int).map(turno_da_rodada)):
+        nome = _nome_aba_arquivo(turno)
+        existente = arquivado.get(nome, _livro_arquivado([]))
+        novas = bloco[~_chaves_livro(bloco).isin(_chaves_livro(existente))]
+        arquivado[nome] = pd.concat([existente, _livro_arquivado(novas.values.tolist())], ignore_index=True)
+        aba = abas.get(nome)
+        if aba is None:
+            aba = planilha.add_worksheet(title=nome, rows=len(novas) + 1, cols=len(COLUNAS_ESPERADAS))
+            aba.update([COLUNAS_ESPERADAS])
+        elif grades[nome] and not _e_cabecalho(grades[nome][0]):
+            _reescrever_planilha(aba, serializar_dados(arquivado[nome]))  # aba sem cabecalho: regrava inteira com ele
+            continue
+        if not novas.empty: aba.append_rows(novas.values.tolist())
+
+    todos = pd.concat(list(arquivado.values()), ignore_index=True) if arquivado else _livro_arquivado([])
+    cobradas = todos[todos["Valor"] > 0]
+    por_time = cobradas.groupby(cobradas["Time"].astype(str), observed=True)["Valor"]
+    aba_acumulado = abas.get(NOME_ABA_ACUMULADO)
+    if aba_acumulado is None: aba_acumulado = planilha.add_worksheet(title=NOME_ABA_ACUMULADO, rows=por_time.ngroups + 1, cols=len(COLUNAS_ACUMULADO))
+    _reescrever_planilha(aba_acumulado, pd.DataFrame({
+        "Time": por_time.size().index.astype(str), "Cobranças": por_time.size().astype(int).values, "Pago": por_time.sum().astype(float).round(2).values,
+    }))
+    _reescrever_planilha(sheet, serializar_dados(df.drop(index=mover.index)))
+    sheet_config.update([["ArquivadoAte"], [int(rodada)]], f"C1:{CELULA_ARQUIVADO}")
+    marcar_revisao()
+    sincronizar_espelho()
+
+    # O periodo exibido passa para o turno ativo (as rodadas arquivadas ficariam com a grade vazia no Resumo)
+    inicio, fim = carregar_periodo()
+    if inicio <= rodada:
+        novo_inicio = min(rodada + 1, RODADA_MAXIMA)
+        salvar_periodo(novo_inicio, max(fim, min(rodada + TOTAL_RODADAS_TURNO, RODADA_MAXIMA)))
+    return len(mover)
+
+@recurso_do_processo(max_entradas=1)
+def _carregar_arquivo(ate):
+    """Todas as abas de arquivo numa leitura em lote; so muda quando mais rodadas sao arquivadas (`ate`)."""
+    planilha = conectar_planilha()
+    if not planilha: raise ConnectionError("Google Sheets indisponível.")
+    grades = _grades_arquivo(planilha, sorted(ws.title for ws in planilha.worksheets() if ws.title.startswith(PREFIXO_ABA_ARQUIVO)))
+    if not grades: return pd.DataFrame(columns=COLUNAS_ESPERADAS)
+    return aplicar_esquema(pd.concat([_livro_arquivado(valores) for valores in grades.values()], ignore_index=True))
+
+def historico_completo(df_fin):
+    """Turnos arquivados + turno ativo, para o que precisa da temporada inteira (ex.: o simulador de regras).
+    So le as abas de arquivo quando chamado; sem nada arquivado devolve o proprio df_fin."""
+    _, _, ate = acumulado_arquivado()
+    if not ate: return df_fin
+    return aplicar_esquema(pd.concat([_carregar_arquivo(ate), df_fin.drop(columns=COLUNA_LINHA, errors="ignore")], ignore_index=True))
+
+def _limpar_arquivo():
+    """Apaga as abas de arquivo, esvazia o Acumulado e zera a ultima rodada arquivada (usado pelo reset).
+    As abas de arquivo saem inteiras: arquivar_ate so escreve o cabecalho quando cria a aba."""
+    planilha, sheet_config = conectar_planilha(), conectar_planilha_config()
+    if planilha:
+        for ws in planilha.worksheets():
+            if ws.title.startswith(PREFIXO_ABA_ARQUIVO): planilha.del_worksheet(ws)
+            elif ws.title == NOME_ABA_ACUMULADO: ws.clear()
+    if sheet_config: sheet_config.update([["ArquivadoAte"], [0]], f"C1:{CELULA_ARQUIVADO}")
+    _carregar_arquivo.clear()
+
+# --- 5. LÓGICA DE CÁLCULO E API ---
+def obter_refresh_token(usar_cache=True):
+    """Le o refresh token da aba Config (A2). Por padrao usa a leitura em lote do carregamento da pagina."""
+    val = None
+    try:
+        if usar_cache:
+            valores = ler_aba_espelho(NOME_ABA_CONFIG)
+            val = valores[1][0] if len(valores) > 1 and valores[1] else None
+        else:
+            sheet_config = conectar_planilha_config()
+            if sheet_config: val = sheet_config.acell('A2').value
+    except: pass
+    if val and len(val) > 50: return val.strip()
+    return segredos()["cartola"]["refresh_token"].strip()
+
+def salvar_novo_refresh_token(novo_rt):
+    sheet_config = conectar_planilha_config()
+    if sheet_config:
+        try:
+            valores = [['RefreshToken_Atualizado'], [novo_rt]]
+            sheet_config.update(valores, 'A1:A2')
+            # O espelho precisa enxergar o token novo, mas o resto de Config!A1:C2 (revisao, ultima rodada arquivada) continua valendo
+            grade = ler_aba_espelho(NOME_ABA_CONFIG)
+            grade += [[] for _ in range(2 - len(grade))]
+            for linha, (valor,) in zip(grade, valores): linha[:1] = [valor]
+            gravar_meta(**{f"aba_{NOME_ABA_CONFIG}": json.dumps(grade)})
+        except Exception as e:
+            avisar("error", f"Erro ao salvar token no separador Config: {e}")
+
+@recurso_do_processo
+def _cofre_token():
+    """Access token compartilhado entre reruns e sessoes do processo; o lock evita rotacoes simultaneas do refresh token."""
+    return {"lock": threading.Lock(), "token": None, "expira": 0.0}
+
+@cronometrado("gerar_token_fresco")
+def gerar_token_fresco(forcar=False):
+    cofre = _cofre_token()
+    with cofre["lock"]:
+        if not forcar and cofre["token"] and time.time() < cofre["expira"] - MARGEM_RENOVACAO_TOKEN:
+            return cofre["token"]
+        token, validade = _renovar_token()
+        if token:
+            cofre["token"], cofre["expira"] = token, time.time() + validade
+        return token
+
+def _renovar_token():
+    """Troca o refresh token por um access token na Globo. Retorna (access_token, validade em segundos)."""
+    try:
+        url_auth = "https://goidc.globo.com/auth/realms/globo.com/protocol/openid-connect/token"
+        headers = {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
+        }
+        # O token em cache pode ter sido rotacionado por outro processo: se a Globo recusar, rele a celula e tenta de novo
+        for usar_cache in (True, False):
+            refresh_token_atual = obter_refresh_token(usar_cache)
+            payload = {
+                'client_id': 'cartola-web@apps.globoid',
+                'grant_type': 'refresh_token',
+                'refresh_token': refresh_token_atual
+            }
+            response = _sessao_http().post(url_auth, data=payload, headers=headers, timeout=TIMEOUT_HTTP)
+            if response.status_code == 200: break
+        
+        if response.status_code == 200:
+            dados = response.json()
+            novo_access = dados.get('access_token')
+            novo_refresh = dados.get('refresh_token')
+            
+            if novo_refresh and novo_refresh != refresh_token_atual:
+                salvar_novo_refresh_token(novo_refresh)
+                
+            return novo_access, float(dados.get('expires_in') or 300)
+        else:
+            avisar("error", f"Erro na renovação do token na Globo. Código: {response.status_code}")
+            return None, 0
+    except Exception as e:
+        avisar("error", f"Erro interno na renovação do token: {e}")
+        return None, 0
+
+@recurso_do_processo
+def _sessao_http():
+    """Sessao HTTP compartilhada (pool de conexoes keep-alive) para a Globo e a API do Cartola."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    sessao = requests.Session()
+    sessao.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=max(MAX_LIGAS_PARALELAS * 2, MAX_REQUISICOES_HISTORICO)))
+    return sessao
+
+def _get_com_retentativa(url, headers):
+    """GET com timeout e backoff exponencial em 429/5xx e falhas de rede (respeita Retry-After)."""
+    import requests
+    for tentativa in range(TENTATIVAS_HTTP):
+        ultima = tentativa == TENTATIVAS_HTTP - 1
+        try:
+            response = _sessao_http().get(url, headers=headers, timeout=TIMEOUT_HTTP)
+        except (requests.ConnectionError, requests.Timeout):
+            if ultima: raise
+            time.sleep(0.5 * 2 ** tentativa)
+            continue
+        if (response.status_code == 429 or response.status_code >= 500) and not ultima:
+            espera = response.headers.get("Retry-After", "")
+            time.sleep(float(espera) if espera.isdigit() else 0.5 * 2 ** tentativa)
+            continue
+        return response
+
+def normalizar_ranking(dados):
+    """Converte a resposta de /auth/liga/{slug} no ranking Time/Posição usado no lançamento."""
+    if not dados or 'times' not in dados: return None
+    df_bruto = pd.DataFrame(dados['times'])
+    df_export = pd.DataFrame()
+    df_export['Time'] = df_bruto['nome_cartola']
+    df_export['Posição'] = df_bruto['ranking'].apply(
+        lambda x: float(x.get('rodada')) if isinstance(x, dict) and x.get('rodada') is not None else 999.0
+    )
+    df_export = df_export.sort_values(by='Posição', ascending=True).reset_index(drop=True)
+    return df_export
+
+def _baixar_liga(slug, token):
+    """Roda nas threads do lote, entao nao chama avisar: devolve (ranking ou None, erro ou None). 401 volta como int."""
+    url = f"{URL_API_CARTOLA}/auth/liga/{slug}"
+    headers = { 'Authorization': f'Bearer {token}', 'User-Agent': 'Mozilla/5.0' }
+    try:
+        response = _get_com_retentativa(url, headers)
+        if response.status_code == 401: return None, 401
+        if response.status_code != 200: return None, f"Código {response.status_code}"
+        return normalizar_ranking(response.json()), None
+    except Exception as e:
+        return None, e
+
+def _baixar_ligas(slugs, token):
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_LIGAS_PARALELAS, len(slugs)))) as pool:
+        return dict(zip(slugs, pool.map(lambda s: _baixar_liga(s, token), slugs)))
+
+@cronometrado("buscar_api")
+def buscar_ligas(slugs):
+    """Busca varias ligas em paralelo com um unico token. Retorna {slug: ranking ou None}."""
+    slugs = list(dict.fromkeys(slugs))
+    if "refresh_token" not in segredos().get("cartola", {}):
+        avisar("error", "⚠️ Refresh Token não configurado em [cartola] nos Secrets.")
+        return {s: None for s in slugs}
+
+    token = gerar_token_fresco()
+    if not token:
+        avisar("error", "⚠️ O Refresh Token expirou ou é inválido. Atualize o ficheiro secrets.toml.")
+        return {s: None for s in slugs}
+
+    resultados = _baixar_ligas(slugs, token)
+    expirados = [s for s, (_, erro) in resultados.items() if erro == 401]
+    if expirados:
+        # Token em cache revogado antes do prazo: renova uma vez e repete so as ligas recusadas
+        token = gerar_token_fresco(forcar=True)
+        if token: resultados.update(_baixar_ligas(expirados, token))
+
+    saida = {}
+    for slug, (ranking, erro) in resultados.items():
+        if erro == 401: erro = "Código 401"
+        if isinstance(erro, Exception): avisar("error", f"Erro ao tentar importar os dados ({slug}): {erro}")
+        elif erro: avisar("error", f"Erro na comunicação com o Cartola ({slug}): {erro}")
+        saida[slug] = ranking
+    return saida
+
+def buscar_api(slug):
+    return buscar_ligas([slug])[slug]
+
+def _classificar_rodada(conta, qtd):
+    """Recebe as cobrancas anteriores de cada time, do pior para o melhor colocado, e devolve o Motivo de cada um.
+    Imunes nao ocupam vaga: a faixa de lanternas desce ate completar `qtd` pagantes."""
+    elegivel = conta < LIMITE_MAX_PAGAMENTOS
+    pagantes_antes = np.cumsum(elegivel) - elegivel
+    return np.where(pagantes_antes < qtd, np.where(elegivel, "Lanterna", "Imune (>10)"), "Salvo")
+
+def calcular(df_ranking, df_hist, rod, base=None):
+    """Lancamentos da rodada `rod`. `base`: cobrancas por time dos turnos arquivados (acumulado_arquivado)."""
+    if df_ranking.empty: return [], [], [], 0, 0
+    
+    qtd = int((len(df_ranking) * PCT_PAGANTES) + 0.5)
+    rank = df_ranking.sort_values("Posição", ascending=False).reset_index(drop=True)
+    
+    conta = pd.Series(dtype=int)
+    if not df_hist.empty and "Rodada" in df_hist.columns and "Valor" in df_hist.columns:
+        validos = df_hist[(df_hist["Rodada"] != rod) & (df_hist["Valor"] > 0)]
+        if not validos.empty: conta = validos["Time"].value_counts()
+    if base is not None and not base.empty: conta = conta.add(base, fill_value=0)
+    
+    motivo = _classificar_rodada(rank["Time"].map(conta).fillna(0).to_numpy(), qtd)
+    lanterna = motivo == "Lanterna"
+    lanc = pd.DataFrame({
+        "Data": datetime.now().strftime("%Y-%m-%d"), "Rodada": rod, "Time": rank["Time"],
+        "Valor": np.where(lanterna, VALOR_RODADA, 0.0), "Pago": ~lanterna, "Motivo": motivo, "Posição": rank["Posição"],
+    })
+    devs, imune, salvos = (lanc[motivo == m].to_dict("records") for m in ("Lanterna", "Imune (>10)", "Salvo"))
+    return devs, imune, salvos, len(df_ranking), qtd
+
+def substituir_rodada(df_fin, rod, lancamentos):
+    """Livro-caixa com a rodada `rod` trocada pelos `lancamentos` (devs + imunes + salvos de calcular)."""
+    if not df_fin.empty and "Rodada" in df_fin.columns:
+        df_limpo = df_fin[df_fin["Rodada"] != rod]
+    else:
+        df_limpo = pd.DataFrame(columns=COLUNAS_ESPERADAS)
+    return pd.concat([df_limpo, pd.DataFrame(lancamentos)], ignore_index=True)
+
+def _nome_coluna_ranking(c):
+    c = str(c).strip().title()
+    return MAPA_COLUNAS_RANKING.get(c, c)
+
+def normalizar_planilha_ranking(x):
+    """Ranking exportado em planilha (nomes de coluna variados) -> Time/Posição. ValueError se nao houver coluna de time."""
+    x = x.copy()
+    x.columns = [_nome_coluna_ranking(c) for c in x.columns]
+    if "Time" not in x.columns: raise ValueError(f"Não achei coluna Time. Tem: {list(x.columns)}")
+    if "Posição" not in x.columns: x["Posição"] = 0.0
+    return x[["Time", "Posição"]].fillna(0)
+
+def recalcular_temporada(df_hist, base=None, arquivado_ate=0):
+    """Refaz o livro-caixa a partir das posicoes gravadas, rodada a rodada em ordem, com o limite de cobrancas acumulado.
+    Cobrancas que continuam valendo mantem Data, Valor e Pago; o indice (e o mapa de linhas) e preservado.
+    Com turnos arquivados a conta parte de `base` e as rodadas ate `arquivado_ate` (dividas em aberto) nao mudam."""
+    if df_hist.empty or "Rodada" not in df_hist.columns: return df_hist.copy()
+    hist = df_hist.copy()
+    hist["Posição"] = pd.to_numeric(hist["Posição"], errors="coerce")
+    codigos, times = pd.factorize(hist["Time"].astype(str))
+    hist["_cod"] = codigos
+    conta = np.zeros(len(times), dtype=int)
+    if base is not None and not base.empty: conta += base.reindex(times).fillna(0).astype(int).to_numpy()
+    partes = []
+    for rodada, g in hist.groupby("Rodada", sort=True):
+        cod = g["_cod"].to_numpy()
+        if rodada <= arquivado_ate:
+            np.add.at(conta, cod[(g["Valor"] > 0).to_numpy()], 1)
+            partes.append(g)
+            continue
+        g = g.sort_values("Posição", ascending=False)
+        cod = g["_cod"].to_numpy()
+        motivo = _classificar_rodada(conta[cod], int((len(g) * PCT_PAGANTES) + 0.5))
+        lanterna = motivo == "Lanterna"
+        np.add.at(conta, cod[lanterna], 1)
+        ja_cobrado = (g["Valor"] > 0).to_numpy()
+        partes.append(g.assign(
+            Motivo=motivo,
+            Valor=np.where(lanterna, np.where(ja_cobrado, g["Valor"], VALOR_RODADA), 0.0),
+            Pago=np.where(lanterna, g["Pago"].astype(bool).to_numpy() & ja_cobrado, True),
+        ))
+    novo = pd.concat(partes).drop(columns="_cod").sort_index()
+    novo["Posição"] = df_hist["Posição"]
+    return aplicar_esquema(novo)
+
+def detectar_alteracoes(df_fin, edicoes):
+    """Cruza as celulas editadas (Time, Rodada, Nv) com as cobrancas do livro-caixa por um indice (Time, Rodada).
+    Retorna so o que muda o Pago: o novo valor indexado pela linha do livro-caixa."""
+    if edicoes.empty or df_fin.empty: return pd.Series(dtype=bool)
+    cobr = df_fin["Valor"].to_numpy() > 0
+    posicoes = pd.Series(np.flatnonzero(cobr), index=pd.MultiIndex.from_arrays([df_fin["Time"][cobr], df_fin["Rodada"][cobr]]))
+    posicoes = posicoes[~posicoes.index.duplicated()]
+    alvo = posicoes.reindex(pd.MultiIndex.from_arrays([edicoes["Time"], edicoes["Rodada"].astype(int)]))
+    achou = alvo.notna().to_numpy()
+    pos = alvo[achou].astype(int).to_numpy()
+    novo = edicoes["Nv"].to_numpy()[achou].astype(bool)
+    muda = df_fin["Pago"].to_numpy()[pos].astype(bool) != novo
+    return pd.Series(novo[muda], index=df_fin.index[pos[muda]])
+
+@cronometrado("resumo_pivot")
+def montar_matriz_resumo(df_fin, rodada_inicio, rodada_fim, base=None):
+    """Matriz Time x Rodada (Pago, ou None sem cobranca) com Status e Cobranças, pronta para o data_editor.
+    `base`: cobrancas dos turnos arquivados, somadas na coluna Cobranças."""
+    df_v = df_fin.assign(Time=df_fin["Time"].astype(str))
+    df_v["V"] = df_v["Pago"].astype(object).where(df_v["Valor"] != 0, None)
+    df_v["Rodada_Str"] = df_v["Rodada"].astype(int).astype(str)
+    matrix = df_v.pivot_table(index="Time", columns="Rodada_Str", values="V", aggfunc="last")
+    todas_rodadas = [str(i) for i in range(rodada_inicio, rodada_fim + 1)]
+    matrix = matrix.reindex(columns=todas_rodadas)
+    matrix = matrix.astype(object)
+    matrix = matrix.where(pd.notnull(matrix), None)
+
+    cobrancas = df_v[df_v["Valor"] > 0]["Time"].value_counts().rename("Cobranças")
+    if base is not None and not base.empty: cobrancas = cobrancas.add(base, fill_value=0).rename("Cobranças")
+    disp = pd.DataFrame(index=df_v["Time"].unique()).join(cobrancas).fillna(0).astype(int)
+    disp = disp.join(matrix)
+    disp.insert(0, "Status", disp["Cobranças"].apply(lambda x: "⚠️ >10" if x >= LIMITE_MAX_PAGAMENTOS else "Ativo"))
+    
+    # Tabela Congelada mantida
+    disp.index.name = "Time"
+    disp = disp.sort_index()
+    return disp, todas_rodadas
+
+@cronometrado("pendencias")
+def resumir_pendencias(df_fin, pago_arquivado=0.0):
+    """Totais pago/aberto, ultima rodada e a tabela de devedores (Devendo por Time, maior primeiro, indice a partir de 1).
+    `pago_arquivado`: o que ja foi pago nos turnos arquivados (la so ha cobrancas quitadas)."""
+    pg = df_fin[(df_fin["Pago"] == True) & (df_fin["Valor"] > 0)]["Valor"].sum() + pago_arquivado
+    ab = df_fin[(df_fin["Pago"] == False) & (df_fin["Valor"] > 0)]["Valor"].sum()
+    max_rod = int(df_fin["Rodada"].max()) if not df_fin["Rodada"].empty else 0
+
+    df_devs = df_fin[(df_fin["Valor"] > 0) & (df_fin["Pago"] == False)]
+    tabela_dev = df_devs.groupby(df_devs["Time"].astype(str))["Valor"].sum().astype(float).reset_index(name="Devendo")
+    tabela_dev = tabela_dev.sort_values("Devendo", ascending=False).reset_index(drop=True)
+    tabela_dev.index = tabela_dev.index + 1
+    return pg, ab, max_rod, tabela_dev
+
+# --- 5.1 IMPORTAÇÃO EM LOTE (historico de varias rodadas num arquivo) ---
+def _numero_rodada(nome):
+    if isinstance(nome, float) and nome.is_integer(): nome = int(nome)
+    m = PADRAO_RODADA.fullmatch(str(nome).strip()) if nome is not None else None
+    return int(m.group(1)) if m else None
+
+def _plano_colunas(cabecalho, rodada=None):
+    """Quais colunas do arquivo sao lidas e o que cada uma vira: "Time", "Rodada", "Posição" ou o numero da rodada
+    (formato largo, uma coluna de posicoes por rodada). Sem nenhuma das duas, o ranking inteiro e da `rodada` (nome da aba)."""
+    nomes = [_nome_coluna_ranking(c) for c in cabecalho]
+    if "Time" not in nomes: raise ValueError(f"Não achei coluna Time. Tem: {nomes}")
+    plano = {nomes.index("Time"): "Time"}
+    por_rodada = {i: n for i, c in enumerate(cabecalho) if (n := _numero_rodada(c)) is not None}
+    if "Rodada" not in nomes and por_rodada: return {**plano, **por_rodada}
+    if "Rodada" in nomes: plano[nomes.index("Rodada")] = "Rodada"
+    elif rodada is None: raise ValueError("Sem coluna Rodada nem colunas por rodada (1, 2, 3...): não sei de que rodada é o ranking.")
+    if "Posição" in nomes: plano[nomes.index("Posição")] = "Posição"
+    return plano
+
+def _formato_longo(df, rodada=None):
+    """Tabela recortada pelo plano -> uma linha por (Time, Rodada) com a Posição."""
+    df = df[df["Time"].notna() & df["Time"].astype(str).str.strip().ne("")]
+    rodadas = [c for c in df.columns if isinstance(c, int)]
+    if rodadas:
+        df = df.melt(id_vars="Time", value_vars=rodadas, var_name="Rodada", value_name="Posição")
+        df = df[pd.to_numeric(df["Posição"], errors="coerce").notna()]  # celula vazia: o time nao jogou a rodada
+    if "Rodada" not in df.columns: df = df.assign(Rodada=rodada)
+    if "Posição" not in df.columns: df = df.assign(Posição=0.0)
+    return pd.DataFrame({
+        "Time": df["Time"].astype(str).str.strip(),
+        "Rodada": pd.to_numeric(df["Rodada"], errors="coerce"),
+        "Posição": pd.to_numeric(df["Posição"], errors="coerce").fillna(0.0),
+    }).dropna(subset=["Rodada"])
+
+def _ler_xlsx(arquivo):
+    """Le aba por aba em modo read-only (linha a linha, guardando so as colunas do plano)."""
+    from openpyxl import load_workbook
+    wb = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            linhas = ws.iter_rows(values_only=True)
+            cab = next(linhas, None)
+            if not cab or all(c is None for c in cab): continue
+            rodada = _numero_rodada(ws.title)
+            try: plano = _plano_colunas(cab, rodada)
+            except ValueError as e: raise ValueError(f"Aba '{ws.title}': {e}") from e
+            colunas = {destino: [] for destino in plano.values()}
+            for linha in linhas:
+                for i, destino in plano.items(): colunas[destino].append(linha[i] if i < len(linha) else None)
+            yield _formato_longo(pd.DataFrame(colunas), rodada)
+    finally: wb.close()
+
+def _ler_csv(arquivo):
+    """Le em blocos de LINHAS_POR_LOTE_IMPORTACAO, so as colunas do plano; aceita separador , ou ;."""
+    if hasattr(arquivo, "read"):
+        primeira = arquivo.readline()
+        arquivo.seek(0)
+        if isinstance(primeira, bytes): primeira = primeira.decode("utf-8-sig")
+    else:
+        with open(arquivo, encoding="utf-8-sig") as f: primeira = f.readline()
+    sep = ";" if primeira.count(";") > primeira.count(",") else ","
+    plano = _plano_colunas(next(csv.reader([primeira], delimiter=sep)))
+    ordem = sorted(plano)
+    for bloco in pd.read_csv(arquivo, sep=sep, usecols=ordem, encoding="utf-8-sig", chunksize=LINHAS_POR_LOTE_IMPORTACAO):
+        bloco.columns = [plano[i] for i in ordem]
+        yield _formato_longo(bloco)
+
+def _ler_parquet(arquivo):
+    try: import pyarrow.parquet as pq
+    except ImportError as e: raise ValueError("Importar Parquet requer o pacote pyarrow.") from e
+    pf = pq.ParquetFile(arquivo)
+    nomes = pf.schema_arrow.names
+    plano = _plano_colunas(nomes)
+    ordem = sorted(plano)
+    for lote in pf.iter_batches(batch_size=LINHAS_POR_LOTE_IMPORTACAO, columns=[nomes[i] for i in ordem]):
+        bloco = lote.to_pandas()
+        bloco.columns = [plano[i] for i in ordem]
+        yield _formato_longo(bloco)
+
+def ler_rankings_em_lote(arquivo, nome=None):
+    """Le um historico com varias rodadas e devolve {rodada: ranking Time/Posição}, em ordem de rodada.
+    Aceita .xlsx (uma aba por rodada, colunas 1, 2, 3... ou coluna Rodada), .csv e .parquet (coluna Rodada ou
+    colunas por rodada), com os mesmos nomes de coluna do lancamento por Excel. ValueError se o arquivo nao servir."""
+    nome = nome or getattr(arquivo, "name", str(arquivo))
+    leitores = {".xlsx": _ler_xlsx, ".xlsm": _ler_xlsx, ".csv": _ler_csv, ".parquet": _ler_parquet}
+    ext = os.path.splitext(nome)[1].lower()
+    if ext not in leitores: raise ValueError(f"Formato não suportado: {nome}. Use .xlsx, .csv ou .parquet.")
+    partes = list(leitores[ext](arquivo))
+    if not partes: return {}
+    longo = pd.concat(partes, ignore_index=True).drop_duplicates(["Rodada", "Time"], keep="last")
+    invalidas = longo["Rodada"][(longo["Rodada"] % 1 != 0) | (longo["Rodada"] < 1) | (longo["Rodada"] > RODADA_MAXIMA)]
+    if not invalidas.empty: raise ValueError(f"Rodadas inválidas no arquivo: {sorted(invalidas.unique().tolist())[:10]}")
+    return {int(r): g[["Time", "Posição"]].reset_index(drop=True) for r, g in longo.groupby("Rodada", sort=True)}
+
+@cronometrado("importar_lote")
+def lancar_rodadas_em_lote(df_fin, rankings, base=None, arquivado_ate=0):
+    """Roda calcular rodada a rodada, em ordem, cada uma enxergando so as cobrancas das rodadas anteriores (do livro-caixa
+    e do lote): uma rodada antiga reimportada nao conta cobrancas que ainda nao existiam naquela altura.
+    Devolve o livro-caixa final (para gravar de uma vez com salvar_dados) e um resumo por rodada.
+    ValueError se o lote tiver rodadas de turnos ja arquivados."""
+    arquivadas = [r for r in rankings if r <= arquivado_ate]
+    if arquivadas: raise ValueError(f"Rodadas de turnos já arquivados (até {arquivado_ate}): {sorted(arquivadas)[:10]}")
+    hist, resumo = df_fin, []
+    for rod, ranking in sorted(rankings.items()):
+        d, i, s, t, p = calcular(ranking, hist[hist["Rodada"] < rod], rod, base)
+        hist = substituir_rodada(hist, rod, d + i + s)
+        resumo.append((rod, t, p, len(i)))
+    return aplicar_esquema(hist), pd.DataFrame(resumo, columns=["Rodada", "Times", "Pagantes", "Imunes"])
+
+# --- 5.2 HISTÓRICO DA API (pontuacao por time e rodada, com cache em disco) ---
+def _cache_caminho(*partes):
+    return os.path.join(PASTA_CACHE_API, *partes)
+
+def _gravar_atomico(caminho, conteudo):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    tmp = f"{caminho}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f: f.write(conteudo)
+    os.replace(tmp, caminho)
+
+def _cache_ler(chave):
+    """Resposta guardada para `chave` (a URL), ou None. O indice aponta para o objeto pelo sha256 do conteudo,
+    que e conferido na leitura (arquivo truncado conta como ausente)."""
+    try:
+        with open(_cache_caminho("chaves", hashlib.sha1(chave.encode("utf-8")).hexdigest()), encoding="utf-8") as f: digest = f.read().strip()
+        with open(_cache_caminho("objetos", digest[:2], digest), "rb") as f: conteudo = f.read()
+    except OSError: return None
+    return conteudo if hashlib.sha256(conteudo).hexdigest() == digest else None
+
+def _cache_gravar(chave, conteudo):
+    digest = hashlib.sha256(conteudo).hexdigest()
+    objeto = _cache_caminho("objetos", digest[:2], digest)
+    if not os.path.exists(objeto): _gravar_atomico(objeto, conteudo)
+    _gravar_atomico(_cache_caminho("chaves", hashlib.sha1(chave.encode("utf-8")).hexdigest()), digest.encode("utf-8"))
+
+def _get_json_com_cache(url, gravar):
+    """GET de um JSON publico da API do Cartola, lido do cache em disco se ja estiver la.
+    So grava com `gravar` (respostas que nao mudam mais, ex.: rodada encerrada)."""
+    conteudo = _cache_ler(url)
+    if conteudo is None:
+        response = _get_com_retentativa(url, {'User-Agent': 'Mozilla/5.0'})
+        if response.status_code != 200: raise ConnectionError(f"Código {response.status_code} em {url}")
+        conteudo = response.content
+        if gravar: _cache_gravar(url, conteudo)
+    return json.loads(conteudo)
+
+def _rodada_atual():
+    try: return int(_get_json_com_cache(f"{URL_API_CARTOLA}/mercado/status", gravar=False)["rodada_atual"])
+    except Exception: return None
+
+def _times_da_liga(slug):
+    """(time_id, nome_cartola) de cada time da liga. A ultima resposta fica no cache e e usada se a API falhar."""
+    chave = f"liga:{slug}"
+    token = gerar_token_fresco()
+    if token:
+        try:
+            response = _get_com_retentativa(f"{URL_API_CARTOLA}/auth/liga/{slug}", {'Authorization': f'Bearer {token}', 'User-Agent': 'Mozilla/5.0'})
+            if response.status_code == 200: _cache_gravar(chave, response.content)
+        except Exception: pass
+    conteudo = _cache_ler(chave)
+    if conteudo is None: raise ConnectionError(f"Não consegui ler os times da liga {slug}.")
+    return [(t["time_id"], t["nome_cartola"]) for t in json.loads(conteudo).get("times", [])]
+
+@cronometrado("historico_api")
+def buscar_historico_liga(slug, rodada_inicio, rodada_fim):
+    """Pontuacao de cada time da liga em cada rodada do intervalo, convertida em ranking por rodada (Time/Posição,
+    1 = mais pontos; 999 sem pontuacao). Mesmo formato de ler_rankings_em_lote: entra direto em lancar_rodadas_em_lote
+    ou, rodada a rodada, em calcular. Rodadas ja encerradas ficam no cache em disco e nao voltam a rede."""
+    times = _times_da_liga(slug)
+    atual = _rodada_atual()
+    pedidos = [(nome, rod, f"{URL_API_CARTOLA}/time/id/{tid}/{rod}") for rod in range(rodada_inicio, rodada_fim + 1) for tid, nome in times]
+
+    def pontos(pedido):
+        _, rod, url = pedido
+        try: return _get_json_com_cache(url, gravar=atual is not None and rod < atual).get("pontos"), None
+        except Exception as e: return None, e
+
+    with ThreadPoolExecutor(max_workers=MAX_REQUISICOES_HISTORICO) as pool:
+        resultados = list(pool.map(pontos, pedidos))
+    falhas = [e for _, e in resultados if e is not None]
+    if falhas:
+        # O que ja veio ficou no cache: repetir a busca so refaz as que falharam
+        raise ConnectionError(f"{len(falhas)} de {len(pedidos)} consultas falharam (ex.: {falhas[0]}). Tente de novo.")
+
+    df = pd.DataFrame([(nome, rod, p) for (nome, rod, _), (p, _) in zip(pedidos, resultados)], columns=["Time", "Rodada", "Pontos"])
+    df["Pontos"] = pd.to_numeric(df["Pontos"], errors="coerce")
+    df["Posição"] = df.groupby("Rodada")["Pontos"].rank(ascending=False, method="min").fillna(999.0)
+    return {int(r): g[["Time", "Posição"]].sort_values("Posição").reset_index(drop=True) for r, g in df.groupby("Rodada", sort=True)}
+
+# --- 5.3 SIMULADOR DE REGRAS (temporada inteira para uma grade de regras, vetorizado) ---
+def _ordem_das_rodadas(df_hist):
+    """Times da temporada e, para cada rodada gravada, os codigos dos times do pior para o melhor colocado
+    (posicao decrescente, sem posicao conta como melhor, empates na ordem do livro-caixa), como no recalculo."""
+    pos = pd.to_numeric(df_hist["Posição"], errors="coerce").fillna(-np.inf).to_numpy(dtype=float)
+    codigos, times = pd.factorize(df_hist["Time"].astype(str))
+    rodada = df_hist["Rodada"].to_numpy()
+    ordem = np.lexsort((-pos, rodada))
+    cortes = np.flatnonzero(np.diff(rodada[ordem])) + 1
+    return times, [codigos[o] for o in np.split(ordem, cortes)]
+
+def rotulo_cenario(valor, pct, limite):
+    return f"R$ {valor:.2f} · {pct:.0%} · limite {limite:g}"
+
+@cronometrado("simulador_regras")
+def simular_regras(df_hist, valores, pcts, limites):
+    """Refaz a temporada gravada para todas as combinacoes de VALOR_RODADA x PCT_PAGANTES x LIMITE_MAX_PAGAMENTOS.
+    As combinacoes (pct, limite) andam juntas numa matriz cenario x time, uma rodada por vez; o valor so multiplica.
+    Retorna (cenarios: totais por cenario, por_time: quanto cada time seria cobrado em cada cenario)."""
+    valores = np.asarray(sorted(set(valores)), dtype=float)
+    regras = np.array([(p, l) for p in sorted(set(pcts)) for l in sorted(set(limites))], dtype=float).reshape(-1, 2)
+    times, rodadas = _ordem_das_rodadas(df_hist) if not df_hist.empty else ([], [])
+    pct, limite = regras[:, 0:1], regras[:, 1:2]
+    conta = np.zeros((len(regras), len(times)), dtype=np.int32)
+    for cod in rodadas:
+        # Mesma regra do _classificar_rodada, para todos os cenarios de uma vez
+        qtd = (len(cod) * pct + 0.5).astype(int)
+        elegivel = conta[:, cod] < limite
+        pagantes_antes = np.cumsum(elegivel, axis=1) - elegivel
+        conta[:, cod] += elegivel & (pagantes_antes < qtd)
+
+    devido = (valores[:, None, None] * conta[None]).reshape(len(valores) * len(regras), len(times))  # (valor, regra) x time
+    iv, ir = np.repeat(np.arange(len(valores)), len(regras)), np.tile(np.arange(len(regras)), len(valores))
+    rotulos = [rotulo_cenario(valores[v], regras[r, 0], regras[r, 1]) for v, r in zip(iv, ir)]
+    cenarios = pd.DataFrame({
+        "Valor": valores[iv], "% Pagantes": regras[ir, 0], "Limite": regras[ir, 1],
+        "Cobranças": conta.sum(axis=1)[ir], "Arrecadação": devido.sum(axis=1),
+        "Maior cobrança": devido.max(axis=1, initial=0), "Times cobrados": (conta > 0).sum(axis=1)[ir],
+    }, index=pd.Index(rotulos, name="Cenário"))
+    por_time = pd.DataFrame(devido.T, index=pd.Index(times, name="Time"), columns=rotulos)
+    return cenarios, por_time
+
+# --- 5.4 VISÕES DERIVADAS (memoizadas por versao do livro-caixa) ---
+@recurso_do_processo
+def _cache_visoes():
+    """Visoes prontas por (versao, rodada_inicio, rodada_fim), compartilhadas entre sessoes; as mais antigas saem primeiro."""
+    return {"lock": threading.Lock(), "visoes": OrderedDict()}
+
+def _guardar_visoes(chave, visoes):
+    cache = _cache_visoes()
+    with cache["lock"]:
+        cache["visoes"][chave] = visoes
+        cache["visoes"].move_to_end(chave)
+        while len(cache["visoes"]) > MAX_VISOES_EM_CACHE: cache["visoes"].popitem(last=False)
+
+def visoes_derivadas(versao, df_fin, rodada_inicio, rodada_fim):
+    """Matriz do Resumo e agregados de Pendências, calculados uma vez por versao do livro-caixa e periodo.
+    Os objetos devolvidos sao compartilhados: quem os usa nao deve altera-los."""
+    chave = (versao, rodada_inicio, rodada_fim)
+    cache = _cache_visoes()
+    with cache["lock"]:
+        if chave in cache["visoes"]:
+            cache["visoes"].move_to_end(chave)
+            return cache["visoes"][chave]
+    base, pago_arquivado, _ = acumulado_arquivado()
+    visoes = {"resumo": montar_matriz_resumo(df_fin, rodada_inicio, rodada_fim, base), "pendencias": resumir_pendencias(df_fin, pago_arquivado)}
+    _guardar_visoes(chave, visoes)
+    return visoes
+
+def _resumir_fora(bloco):
+    cobradas = bloco.notna().sum(axis=1)
+    pagas = bloco.eq(True).sum(axis=1)
+    return pagas.astype(str) + "/" + cobradas.astype(str)
+
+def _rotulo_faixa(rodadas):
+    # Nunca o nome puro da rodada: a coluna resumida e texto e nao pode ser confundida com a de checkboxes
+    return f"{rodadas[0]} (resumo)" if len(rodadas) == 1 else f"{rodadas[0]}–{rodadas[-1]}"
+
+def janela_resumo(disp, todas_rodadas, visiveis, fatia_times=None):
+    """Recorta a matriz do Resumo nas rodadas `visiveis` (e numa fatia de times); as rodadas antes e depois
+    da janela viram uma coluna de texto cada, com pagas/cobradas por time."""
+    if len(visiveis) == len(todas_rodadas) and fatia_times is None: return disp
+    base = disp if fatia_times is None else disp.iloc[fatia_times]
+    ini, fim = todas_rodadas.index(visiveis[0]), todas_rodadas.index(visiveis[-1])
+    antes, depois = todas_rodadas[:ini], todas_rodadas[fim + 1:]
+    grade = base[["Status", "Cobranças"]].copy()
+    if antes: grade[_rotulo_faixa(antes)] = _resumir_fora(base[antes])
+    grade = grade.join(base[visiveis])
+    if depois: grade[_rotulo_faixa(depois)] = _resumir_fora(base[depois])
+    return grade
+
+def propagar_pagamentos(versao_antiga, df_antes, alteracoes):
+    """Depois de salvar so mudancas de Pago, deriva as visoes da versao nova a partir das antigas em vez de refazer o pivot.
+    So propaga se o livro-caixa relido for exatamente o antigo com essas mudancas (nenhuma outra gravacao no meio)."""
+    df_novo, _, versao_nova = carregar_dados_versionados()
+    if versao_nova is None or versao_nova == versao_antiga or len(df_novo) != len(df_antes): return
+    esperado = df_antes["Pago"].astype(bool).copy()
+    esperado.loc[alteracoes.index] = alteracoes.values
+    for col in ("Time", "Rodada", "Valor"):
+        if not np.array_equal(df_novo[col].to_numpy(), df_antes[col].to_numpy()): return
+    if not np.array_equal(df_novo["Pago"].to_numpy(bool), esperado.to_numpy(bool)): return
+
+    mudou = df_antes.loc[alteracoes.index, ["Time", "Rodada", "Valor"]].assign(Pago=alteracoes.values)
+    pago_agora = mudou.loc[mudou["Pago"], "Valor"].sum()
+    aberto_agora = mudou.loc[~mudou["Pago"], "Valor"].sum()
+    delta_divida = mudou.assign(d=np.where(mudou["Pago"], -mudou["Valor"], mudou["Valor"])).groupby(mudou["Time"].astype(str))["d"].sum()
+    with _cache_visoes()["lock"]:
+        antigas = [(k, v) for k, v in _cache_visoes()["visoes"].items() if k[0] == versao_antiga]
+    for (_, ini, fim), visoes in antigas:
+        disp, todas_rodadas = visoes["resumo"]
+        disp = disp.copy()
+        dentro = mudou[(mudou["Rodada"] >= ini) & (mudou["Rodada"] <= fim)]
+        for t, r, p in zip(dentro["Time"], dentro["Rodada"], dentro["Pago"]): disp.at[t, str(int(r))] = bool(p)
+
+        pg, ab, max_rod, tabela_dev = visoes["pendencias"]
+        devendo = tabela_dev.set_index("Time")["Devendo"].add(delta_divida, fill_value=0)
+        tabela_dev = devendo[devendo > 0.005].sort_values(ascending=False).reset_index(name="Devendo")
+        tabela_dev.columns = ["Time", "Devendo"]
+        tabela_dev.index = tabela_dev.index + 1
+        _guardar_visoes((versao_nova, ini, fim), {
+            "resumo": (disp, todas_rodadas),
+            "pendencias": (pg + pago_agora - aberto_agora, ab + aberto_agora - pago_agora, max_rod, tabela_dev),
+        })
+
+# --- 5.5 MONITOR DE RANKING (rodada ao vivo, em segundo plano) ---
+@recurso_do_processo
+def _rankings_ao_vivo():
+    """Ultimo ranking de cada liga monitorada, compartilhado por todas as sessoes do processo.
+    `final` e a ultima rodada cujo ranking foi lido com o mercado ja aberto (ranking final, com as correcoes)."""
+    return {"lock": threading.Lock(), "ligas": {}, "rodada": None, "ao_vivo": False, "final": None}
+
+def ligas_monitoradas():
+    """Slugs em [cartola] ligas_monitoradas nos segredos; sem a chave, o monitor fica desligado."""
+    return list(segredos().get("cartola", {}).get("ligas_monitoradas", []))
+
+def ranking_ao_vivo(slug):
+    """Ultima leitura do monitor para `slug` (ranking, rodada, atualizado, verificado, erro) ou None. Nunca vai a rede."""
+    cache = _rankings_ao_vivo()
+    with cache["lock"]:
+        entrada = cache["ligas"].get(slug)
+        return dict(entrada) if entrada else None
+
+def _status_mercado():
+    """(rodada_atual, status_mercado) da API publica do Cartola."""
+    response = _get_com_retentativa(f"{URL_API_CARTOLA}/mercado/status", {'User-Agent': 'Mozilla/5.0'})
+    if response.status_code != 200: raise ConnectionError(f"Código {response.status_code} no status do mercado")
+    dados = response.json()
+    return int(dados["rodada_atual"]), int(dados.get("status_mercado") or 0)
+
+def _consultar_liga(slug, token, anterior):
+    """GET condicional da liga: manda o ETag/Last-Modified da ultima resposta e compara o hash do corpo, entao um
+    ranking igual ao anterior nao e reprocessado. Retorna (validadores, ranking novo ou None se nao mudou, erro)."""
+    headers = {'Authorization': f'Bearer {token}', 'User-Agent': 'Mozilla/5.0'}
+    if anterior and anterior["etag"]: headers['If-None-Match'] = anterior["etag"]
+    if anterior and anterior["modificado"]: headers['If-Modified-Since'] = anterior["modificado"]
+    try: response = _get_com_retentativa(f"{URL_API_CARTOLA}/auth/liga/{slug}", headers)
+    except Exception as e: return None, None, e
+    if response.status_code == 304: return None, None, None
+    if response.status_code == 401: return None, None, 401
+    if response.status_code != 200: return None, None, f"Código {response.status_code}"
+    validadores = {"etag": response.headers.get("ETag"), "modificado": response.headers.get("Last-Modified"), "hash": hashlib.sha1(response.content).hexdigest()}
+    if anterior and validadores["hash"] == anterior["hash"]: return validadores, None, None
+    ranking = normalizar_ranking(response.json())
+    if ranking is None: return None, None, "Resposta sem times"
+    return validadores, ranking, None
+
+@cronometrado("monitor_ranking")
+def atualizar_rankings_ao_vivo(slugs, rodada=None):
+    """Uma passada do monitor: consulta as ligas em paralelo e troca no cache so os rankings que mudaram.
+    Roda fora das sessoes, entao registra falhas no log em vez de avisar. Retorna os slugs que mudaram."""
+    token = gerar_token_fresco()
+    if not token: return []
+    cache = _rankings_ao_vivo()
+    with cache["lock"]: anteriores = {s: cache["ligas"].get(s) for s in slugs}
+    def consultar(token, slugs):
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_LIGAS_PARALELAS, len(slugs)))) as pool:
+            return dict(zip(slugs, pool.map(lambda s: _consultar_liga(s, token, anteriores[s]), slugs)))
+    resultados = consultar(token, slugs)
+    expirados = [s for s, (_, _, erro) in resultados.items() if erro == 401]
+    if expirados:
+        token = gerar_token_fresco(forcar=True)
+        if token: resultados.update(consultar(token, expirados))
+
+    agora, mudaram = time.time(), []
+    with cache["lock"]:
+        for slug, (validadores, ranking, erro) in resultados.items():
+            entrada = cache["ligas"].get(slug)
+            if erro is not None:
+                log.warning("Monitor de ranking (%s): %s", slug, erro)
+                if entrada: entrada["erro"] = str(erro)
+                continue
+            if ranking is not None:
+                entrada = cache["ligas"][slug] = {"ranking": ranking, "rodada": rodada, "atualizado": agora}
+                mudaram.append(slug)
+            if entrada:
+                if validadores: entrada.update(validadores)
+                entrada.update(verificado=agora, erro=None)
+    return mudaram
+
+def _laco_monitor_ranking(slugs):
+    while True:
+        ao_vivo = False
+        try:
+            rodada, status = _status_mercado()
+            ao_vivo = status == STATUS_MERCADO_AO_VIVO
+            cache = _rankings_ao_vivo()
+            with cache["lock"]: cache["rodada"], cache["ao_vivo"] = rodada, ao_vivo
+            # Com o mercado aberto a rodada_atual e a proxima: o ranking da liga e o final da anterior. Ele e buscado
+            # uma vez (ao abrir o mercado ou ao subir o processo): a ultima leitura ao vivo pode ser de ate um
+            # intervalo antes do fim e de antes das correcoes de pontuacao
+            if ao_vivo or cache["final"] != rodada - 1:
+                atualizar_rankings_ao_vivo(slugs, rodada if ao_vivo else rodada - 1)
+                if not ao_vivo and all((ranking_ao_vivo(s) or {"erro": "sem leitura"})["erro"] is None for s in slugs):
+                    with cache["lock"]: cache["final"] = rodada - 1
+        except Exception as e: log.warning("Monitor de ranking: %s", e)
+        time.sleep(INTERVALO_MONITOR_RANKING if ao_vivo else INTERVALO_MONITOR_MERCADO)
+
+@recurso_do_processo
+def iniciar_monitor_ranking():
+    """Sobe (uma vez por processo) a thread que mantem os rankings das ligas monitoradas; None se nao houver ligas."""
+    slugs = ligas_monitoradas()
+    if not slugs: return None
+    t = threading.Thread(target=_laco_monitor_ranking, args=(slugs,), name="monitor-ranking", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,192 @@
+"""Linha de comando do Gestor Cartola: processa rodadas sem a interface (ex.: num cron depois do fim da rodada).
+
+Uso:
+    python cartola_gestor.py lancar --rodada 5                          # liga padrao, via API do Cartola
+    python cartola_gestor.py lancar --rodada 5 --slug minha-liga --simular
+    python cartola_gestor.py lancar --rodada 5 --excel ranking.xlsx
+    python cartola_gestor.py importar historico.xlsx [--simular]        # varias rodadas (.xlsx, .csv ou .parquet)
+    python cartola_gestor.py historico --de 1 --ate 10 [--slug minha-liga] [--simular]  # pontuacoes da API do Cartola
+    python cartola_gestor.py recalcular [--simular]
+    python cartola_gestor.py pendencias
+    python cartola_gestor.py arquivar --ate 19 [--simular]                # tira o 1o turno quitado da aba Dados
+    python cartola_gestor.py sincronizar
+
+Os segredos vem do mesmo secrets.toml do app (.streamlit/ ao lado do app ou em ~/.streamlit/).
+Sai com 0 quando deu tudo certo e 1 em qualquer falha (planilha fora do ar, token invalido, rodada fora do periodo...).
+"""
+import argparse
+import logging
+import sys
+
+
+def _nucleo():
+    # Importado so quando um comando roda: o --help nao paga pandas/numpy
+    import cartola_core
+    return cartola_core
+
+
+def _livro_atualizado(core):
+    """Poe o espelho em dia com a planilha (envia gravacoes pendentes; so repuxa se a revisao mudou) e devolve o livro-caixa."""
+    if not core.atualizar_espelho(): raise SystemExit("Google Sheets indisponível: nada foi feito.")
+    df, status = core.carregar_dados()
+    if status not in ("Sucesso", "Vazio"): raise SystemExit(f"Falha ao ler o livro-caixa: {status}")
+    return df
+
+
+def _gravar(core, df, df_base):
+    if core.salvar_dados(df, df_base):
+        print("Gravado na planilha.")
+        return 0
+    print("Planilha indisponível: gravado só no espelho local, será enviado na próxima sincronização.", file=sys.stderr)
+    return 1
+
+
+def _lancar_lote(core, rankings, simular):
+    if not rankings:
+        print("Nenhuma rodada para lançar.")
+        return 0
+    df_fin = _livro_atualizado(core)
+    base, _, arquivado_ate = core.acumulado_arquivado()
+    try: df_lote, resumo = core.lancar_rodadas_em_lote(df_fin, rankings, base, arquivado_ate)
+    except ValueError as e: raise SystemExit(str(e))
+    print(resumo.to_string(index=False))
+    if simular: return 0
+    return _gravar(core, df_lote, df_fin)
+
+
+def cmd_lancar(args):
+    core = _nucleo()
+    df_fin = _livro_atualizado(core)
+    inicio, fim = core.carregar_periodo()
+    if not inicio <= args.rodada <= fim:
+        raise SystemExit(f"Rodada {args.rodada} fora do período configurado ({inicio} a {fim}).")
+    base, _, arquivado_ate = core.acumulado_arquivado()
+    if args.rodada <= arquivado_ate: raise SystemExit(f"Rodada {args.rodada} está num turno arquivado (até {arquivado_ate}).")
+
+    if args.excel:
+        import pandas as pd
+        ranking = core.normalizar_planilha_ranking(pd.read_excel(args.excel))
+    else:
+        ranking = core.buscar_api(args.slug)
+        if ranking is None: return 1
+
+    d, i, s, t, p = core.calcular(ranking, df_fin, args.rodada, base)
+    print(f"Rodada {args.rodada}: {p} pagantes de {t} times ({len(i)} imune(s)).")
+    for lanc in d: print(f"  {lanc['Time']}: R$ {lanc['Valor']:.2f}")
+    ja_gravados = int((df_fin["Rodada"] == args.rodada).sum()) if not df_fin.empty else 0
+    if ja_gravados: print(f"Substitui {ja_gravados} lançamento(s) já gravados da rodada {args.rodada}.")
+    if args.simular: return 0
+    return _gravar(core, core.substituir_rodada(df_fin, args.rodada, d + i + s), df_fin)
+
+
+def cmd_importar(args):
+    core = _nucleo()
+    try: rankings = core.ler_rankings_em_lote(args.arquivo)
+    except ValueError as e: raise SystemExit(str(e))
+    return _lancar_lote(core, rankings, args.simular)
+
+
+def cmd_historico(args):
+    if args.de > args.ate: raise SystemExit("--de não pode ser maior que --ate.")
+    core = _nucleo()
+    try: rankings = core.buscar_historico_liga(args.slug or core.SLUG_LIGA_PADRAO, args.de, args.ate)
+    except ConnectionError as e: raise SystemExit(str(e))
+    return _lancar_lote(core, rankings, args.simular)
+
+
+def cmd_recalcular(args):
+    core = _nucleo()
+    df_fin = _livro_atualizado(core)
+    if df_fin.empty:
+        print("Livro-caixa vazio.")
+        return 0
+    base, _, arquivado_ate = core.acumulado_arquivado()
+    df_rec = core.recalcular_temporada(df_fin, base, arquivado_ate)
+    mudancas = int(((df_rec["Valor"] != df_fin["Valor"]) | (df_rec["Motivo"].astype(str) != df_fin["Motivo"].astype(str))).sum())
+    print(f"{mudancas} lançamento(s) mudam com o recálculo.")
+    if args.simular or mudancas == 0: return 0
+    return _gravar(core, df_rec, df_fin)
+
+
+def cmd_pendencias(args):
+    core = _nucleo()
+    if not core.atualizar_espelho(): print("Google Sheets indisponível: mostrando o espelho local.", file=sys.stderr)
+    df_fin, status = core.carregar_dados()
+    if df_fin.empty:
+        print(f"Sem dados ({status}).")
+        return 0 if status == "Vazio" else 1
+    pg, ab, max_rod, tabela_dev = core.resumir_pendencias(df_fin, core.acumulado_arquivado()[1])
+    print(f"Pago: R$ {pg:.2f} | Aberto: R$ {ab:.2f} | Última rodada: {max_rod}")
+    if tabela_dev.empty: print("Tudo pago! Ninguém devendo.")
+    else: print(tabela_dev.to_string(formatters={"Devendo": "R$ {:.2f}".format}))
+    return 0
+
+
+def cmd_arquivar(args):
+    core = _nucleo()
+    df_fin = _livro_atualizado(core)
+    _, _, arquivado_ate = core.acumulado_arquivado()
+    if args.ate <= arquivado_ate: raise SystemExit(f"As rodadas até {arquivado_ate} já estão arquivadas.")
+    saem = core.linhas_arquivaveis(df_fin, args.ate)
+    abertas = int(((df_fin["Rodada"] <= args.ate) & ~df_fin["Pago"].astype(bool) & (df_fin["Valor"] > 0)).sum()) if not df_fin.empty else 0
+    print(f"{len(saem)} linha(s) saem da aba Dados; {abertas} dívida(s) em aberto ficam no turno ativo.")
+    if args.simular: return 0
+    try: core.arquivar_ate(args.ate)
+    except (ValueError, ConnectionError) as e: raise SystemExit(str(e))
+    print(f"Arquivado até a rodada {args.ate}.")
+    return 0
+
+
+def cmd_sincronizar(args):
+    if _nucleo().sincronizar_espelho():
+        print("Espelho sincronizado.")
+        return 0
+    print("Google Sheets indisponível.", file=sys.stderr)
+    return 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="cartola-gestor", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-v", "--verbose", action="store_true", help="mostra os logs do nucleo")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("lancar", help="calcula e grava uma rodada a partir do ranking da liga")
+    p.add_argument("--rodada", type=int, required=True)
+    origem = p.add_mutually_exclusive_group()
+    origem.add_argument("--slug", help="slug da liga na API do Cartola (padrao: a liga do app)")
+    origem.add_argument("--excel", help="ranking exportado em .xlsx em vez da API")
+    p.add_argument("--simular", action="store_true", help="so mostra o resultado, sem gravar")
+    p.set_defaults(funcao=cmd_lancar)
+
+    p = sub.add_parser("importar", help="calcula e grava varias rodadas de um historico (.xlsx, .csv ou .parquet)")
+    p.add_argument("arquivo")
+    p.add_argument("--simular", action="store_true", help="so mostra o resumo por rodada, sem gravar")
+    p.set_defaults(funcao=cmd_importar)
+
+    p = sub.add_parser("historico", help="busca as pontuacoes de um intervalo de rodadas na API e lanca como no importar")
+    p.add_argument("--de", type=int, required=True, help="primeira rodada")
+    p.add_argument("--ate", type=int, required=True, help="ultima rodada (inclusiva)")
+    p.add_argument("--slug", help="slug da liga (padrao: a liga do app)")
+    p.add_argument("--simular", action="store_true", help="so mostra o resumo por rodada, sem gravar")
+    p.set_defaults(funcao=cmd_historico)
+
+    p = sub.add_parser("recalcular", help="refaz a temporada inteira a partir das posicoes gravadas")
+    p.add_argument("--simular", action="store_true", help="so conta as mudancas, sem gravar")
+    p.set_defaults(funcao=cmd_recalcular)
+
+    sub.add_parser("pendencias", help="totais pago/aberto e a lista de devedores").set_defaults(funcao=cmd_pendencias)
+    p = sub.add_parser("arquivar", help="move as rodadas quitadas ate --ate para as abas de arquivo (uma por turno)")
+    p.add_argument("--ate", type=int, required=True, help="ultima rodada a arquivar (inclusiva)")
+    p.add_argument("--simular", action="store_true", help="so conta as linhas, sem mover nada")
+    p.set_defaults(funcao=cmd_arquivar)
+
+    sub.add_parser("sincronizar", help="envia gravacoes pendentes e repuxa a planilha inteira para o espelho local").set_defaults(funcao=cmd_sincronizar)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(levelname)s: %(message)s")
+    if args.comando == "lancar" and not args.excel and not args.slug: args.slug = _nucleo().SLUG_LIGA_PADRAO
+    return args.funcao(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""Backends falsos para rodar a logica do app sem rede: uma planilha gspread em memoria e a API do Cartola.
+
+Usados pelo benchmark (bench_cartola.py) e pelo teste de carga (carga_cartola.py). Implementam so o subconjunto da API que o cartola_core.py chama.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+import gspread
+from gspread.utils import a1_to_rowcol
+
+
+class _Contador:
+    """Conta chamadas ao backend e simula a latencia de rede de cada uma.
+    Com `origem` (funcao sem argumentos que devolve um rotulo), conta tambem por origem em `por_origem`."""
+
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+        self.chamadas = Counter()
+        self.origem = None
+        self.por_origem = defaultdict(Counter)
+        self._trava = threading.Lock()
+
+    def registrar(self, nome):
+        rotulo = self.origem() if self.origem else None
+        with self._trava:
+            self.chamadas[nome] += 1
+            if rotulo: self.por_origem[rotulo][nome] += 1
+        if self.latencia: time.sleep(self.latencia)
+
+
+def _fora_da_grade(faixa, aba):
+    return gspread.exceptions.APIError(_RespostaFake(400, {"error": {"code": 400, "status": "INVALID_ARGUMENT",
+        "message": f"Range ({aba.title}!{faixa}) exceeds grid limits. Max rows: {aba.row_count}, max columns: {aba.col_count}"}}))
+
+
+class AbaFake:
+    """Aba em memoria. Como no Sheets, tem um tamanho de grade (`rows` x `cols`, padrao 1000 x 26 ou o do conteudo
+    inicial): ler ou gravar fora dela da erro; append_rows e resize aumentam a grade."""
+
+    def __init__(self, planilha, titulo, sheet_id, linhas=None, rows=1000, cols=26):
+        self.planilha = planilha
+        self.title = titulo
+        self.id = sheet_id
+        self.linhas = [list(l) for l in (linhas or [])]
+        self.row_count = max([rows, len(self.linhas)])
+        self.col_count = max([cols] + [len(l) for l in self.linhas])
+        self._trava = threading.Lock()
+
+    spreadsheet = property(lambda self: self.planilha)
+
+    def _conferir_grade(self, faixa, r1, c1):
+        if r1 > self.row_count or c1 > self.col_count: raise _fora_da_grade(faixa, self)
+
+    def _gravar(self, linha, coluna, valor):
+        while len(self.linhas) < linha: self.linhas.append([])
+        atual = self.linhas[linha - 1]
+        while len(atual) < coluna: atual.append("")
+        atual[coluna - 1] = valor
+
+    def _limpar(self, faixa):
+        m = re.fullmatch(r"(\d+):(\d+)", faixa)
+        if m:
+            r0, r1, c0, c1 = int(m.group(1)), int(m.group(2)), 1, self.col_count
+        else:
+            ini, _, fim = faixa.partition(":")
+            (r0, c0), (r1, c1) = a1_to_rowcol(ini), a1_to_rowcol(fim or ini)
+        self._conferir_grade(faixa, r1, c1)
+        for r in range(r0, min(r1, len(self.linhas)) + 1):
+            for c in range(c0, min(c1, len(self.linhas[r - 1])) + 1): self.linhas[r - 1][c - 1] = ""
+
+    def valores(self):
+        """Grade como a API devolve: strings, sem linhas/colunas vazias no final."""
+        grade = [["" if v is None else str(v) for v in l] for l in self.linhas]
+        grade = [l[:max([i + 1 for i, v in enumerate(l) if v != ""] or [0])] for l in grade]
+        while grade and not grade[-1]: grade.pop()
+        return grade
+
+    def update(self, valores, range_name="A1"):
+        self.planilha.contador.registrar("update")
+        r0, c0 = a1_to_rowcol(range_name.split(":")[0])
+        self._conferir_grade(range_name, r0 + len(valores) - 1, c0 + max([0] + [len(l) for l in valores]) - 1)
+        with self._trava:
+            for i, linha in enumerate(valores):
+                for j, v in enumerate(linha): self._gravar(r0 + i, c0 + j, v)
+
+    def batch_update(self, dados):
+        self.planilha.contador.registrar("batch_update")
+        with self._trava:
+            for d in dados:
+                r0, c0 = a1_to_rowcol(d["range"].split(":")[0])
+                self._conferir_grade(d["range"], r0 + len(d["values"]) - 1, c0 + max([0] + [len(l) for l in d["values"]]) - 1)
+                for i, linha in enumerate(d["values"]):
+                    for j, v in enumerate(linha): self._gravar(r0 + i, c0 + j, v)
+
+    def batch_clear(self, faixas):
+        self.planilha.contador.registrar("batch_clear")
+        with self._trava:
+            for f in faixas: self._limpar(f)
+
+    def append_rows(self, valores):
+        self.planilha.contador.registrar("append_rows")
+        with self._trava:
+            ocupadas = len(self.valores())
+            del self.linhas[ocupadas:]
+            self.linhas += [list(l) for l in valores]
+            self.row_count = max(self.row_count, len(self.linhas))
+            self.col_count = max([self.col_count] + [len(l) for l in valores])
+
+    def append_row(self, valores):
+        self.append_rows([valores])
+
+    def resize(self, rows=None, cols=None):
+        self.planilha.contador.registrar("resize")
+        with self._trava:
+            if rows is not None:
+                self.row_count = rows
+                del self.linhas[rows:]
+            if cols is not None:
+                self.col_count = cols
+                for l in self.linhas: del l[cols:]
+
+    def clear(self):
+        self.planilha.contador.registrar("clear")
+        with self._trava: self.linhas = []
+
+    def acell(self, a1):
+        self.planilha.contador.registrar("acell")
+        r, c = a1_to_rowcol(a1)
+        self._conferir_grade(a1, r, c)
+        grade = self.valores()
+        valor = grade[r - 1][c - 1] if r <= len(grade) and c <= len(grade[r - 1]) else None
+        return gspread.Cell(r, c, valor)
+
+
+class PlanilhaFake:
+    """Stand-in de gspread.Spreadsheet guardado em memoria, com contagem de chamadas e latencia opcional."""
+
+    def __init__(self, latencia=0.0):
+        self.contador = _Contador(latencia)
+        self.abas = {}
+
+    def add_worksheet(self, title, rows=0, cols=0):
+        self.contador.registrar("add_worksheet")
+        self.abas[title] = AbaFake(self, title, max([a.id for a in self.abas.values()], default=-1) + 1, rows=rows, cols=cols)
+        return self.abas[title]
+
+    def del_worksheet(self, worksheet):
+        self.contador.registrar("del_worksheet")
+        del self.abas[worksheet.title]
+
+    def worksheet(self, titulo):
+        self.contador.registrar("worksheet")
+        if titulo not in self.abas: raise gspread.exceptions.WorksheetNotFound(titulo)
+        return self.abas[titulo]
+
+    def worksheets(self):
+        self.contador.registrar("worksheets")
+        return list(self.abas.values())
+
+    def values_batch_get(self, faixas):
+        self.contador.registrar("values_batch_get")
+        saida = []
+        for faixa in faixas:
+            m = re.fullmatch(r"'(.+?)'(?:!([A-Z]+\d+):([A-Z]+\d+))?", faixa)
+            titulo = m.group(1)
+            if titulo not in self.abas: raise gspread.exceptions.APIError(_RespostaFake(400, {"error": {"code": 400, "message": f"Unable to parse range: {faixa}", "status": "INVALID_ARGUMENT"}}))
+            grade = self.abas[titulo].valores()
+            if m.group(2):
+                (r0, c0), (r1, c1) = a1_to_rowcol(m.group(2)), a1_to_rowcol(m.group(3))
+                self.abas[titulo]._conferir_grade(faixa, r1, c1)
+                grade = [l[c0 - 1:c1] for l in grade[r0 - 1:r1]]
+            saida.append({"range": faixa, "values": grade} if grade else {"range": faixa})
+        return {"valueRanges": saida}
+
+    def batch_update(self, corpo):
+        self.contador.registrar("spreadsheet.batch_update")
+        for req in corpo.get("requests", []):
+            faixa = req["deleteDimension"]["range"]
+            aba = next(a for a in self.abas.values() if a.id == faixa["sheetId"])
+            with aba._trava:
+                del aba.linhas[faixa["startIndex"]:faixa["endIndex"]]
+                aba.row_count -= faixa["endIndex"] - faixa["startIndex"]
+        return {}
+
+
+class _RespostaFake:
+    def __init__(self, status_code, corpo, headers=None):
+        self.status_code = status_code
+        self._corpo = corpo
+        self.headers = headers or {}
+        self.text = json.dumps(corpo)
+        self.content = self.text.encode("utf-8")
+
+    def json(self):
+        return self._corpo
+
+
+class SessaoCartolaFake:
+    """Substitui o requests.Session do app: responde ao OIDC da Globo, a /auth/liga/{slug} com ligas sinteticas,
+    a /time/id/{id}/{rodada} com pontuacoes sinteticas e a /mercado/status (rodada_atual, status_mercado).
+    A liga manda ETag e responde 304 a um If-None-Match igual; mudar `semente` muda o ranking."""
+
+    def __init__(self, n_times=20, latencia=0.0, semente=0, rodada_atual=39, status_mercado=1):
+        self.contador = _Contador(latencia)
+        self.n_times = n_times
+        self.semente = semente
+        self.rodada_atual = rodada_atual
+        self.status_mercado = status_mercado
+
+    def post(self, url, **kwargs):
+        self.contador.registrar("post")
+        return _RespostaFake(200, {"access_token": "token-fake", "expires_in": 3600})
+
+    def get(self, url, **kwargs):
+        self.contador.registrar("get")
+        rng = random.Random(f"{self.semente}-{url}")
+        if url.endswith("/mercado/status"): return _RespostaFake(200, {"rodada_atual": self.rodada_atual, "status_mercado": self.status_mercado})
+        if "/time/id/" in url: return _RespostaFake(200, {"pontos": round(rng.uniform(20, 120), 2)})
+        etag = f'"{self.semente}-{self.n_times}"'
+        if kwargs.get("headers", {}).get("If-None-Match") == etag: return _RespostaFake(304, None)
+        posicoes = rng.sample(range(1, self.n_times + 1), self.n_times)
+        return _RespostaFake(200, {"times": [{"time_id": 1000 + i, "nome_cartola": f"Time {i:04d}", "ranking": {"rodada": p}} for i, p in enumerate(posicoes)]}, {"ETag": etag})
+
+
+def gerar_livro_caixa(colunas, n_times, n_rodadas, pct_pagantes=0.25, valor=7.0, semente=0):
+    """Grade crua da aba Dados (cabecalho `colunas` + linhas) com um ranking aleatorio por rodada."""
+    rng = random.Random(semente)
+    times = [f"Time {i:04d}" for i in range(n_times)]
+    qtd = int(n_times * pct_pagantes + 0.5)
+    grade = [list(colunas)]
+    for rod in range(1, n_rodadas + 1):
+        for pos, t in enumerate(rng.sample(times, n_times), start=1):
+            cobrado = pos > n_times - qtd
+            pago = (not cobrado) or rng.random() < 0.6
+            grade.append([f"2026-04-{1 + rod % 28:02d}", rod, t, valor if cobrado else 0.0, "TRUE" if pago else "FALSE", "Lanterna" if cobrado else "Salvo", float(pos)])
+    return grade
+
+
+def planilha_com_livro(grade, latencia=0.0):
+    planilha = PlanilhaFake(latencia)
+    planilha.abas["Dados"] = AbaFake(planilha, "Dados", 0, grade)
+    planilha.abas["Config"] = AbaFake(planilha, "Config", 1, [["RefreshToken_Atualizado"], ["r" * 64]])
+    planilha.abas["Periodo"] = AbaFake(planilha, "Periodo", 2, [["Inicio", "fim"], [1, 38]])
+    return planilha
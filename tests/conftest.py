@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cartola_core  # noqa: E402
+import planilha_fake  # noqa: E402
+from bench_cartola import usar_backends  # noqa: E402
+
+
+@pytest.fixture
+def nucleo(tmp_path):
+    """cartola_core apontado para uma planilha e uma API falsas novas e um espelho SQLite em tmp_path.
+    Devolve a funcao que monta o livro-caixa (grade crua da aba Dados) e retorna (core, planilha)."""
+    def montar(grade=None, n_times=12, n_rodadas=25):
+        if grade is None: grade = planilha_fake.gerar_livro_caixa(cartola_core.COLUNAS_ESPERADAS, n_times, n_rodadas)
+        planilha = planilha_fake.planilha_com_livro(grade)
+        cartola_core.configurar(segredos={"cartola": {"refresh_token": "r" * 64}})
+        usar_backends(cartola_core, planilha, planilha_fake.SessaoCartolaFake(n_times), str(tmp_path))
+        cartola_core._carregar_arquivo.clear()
+        cartola_core._cache_visoes.clear()
+        return cartola_core, planilha
+    return montar
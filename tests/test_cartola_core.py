@@ -0,0 +1,232 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import cartola_core
+import planilha_fake
+from cartola_core import COLUNAS_ESPERADAS
+
+
+def test_token_novo_nao_apaga_rodada_arquivada(nucleo):
+    core, planilha = nucleo()
+    core.arquivar_ate(19)
+    assert core.acumulado_arquivado()[2] == 19
+
+    core.salvar_novo_refresh_token("n" * 64)
+
+    assert core.acumulado_arquivado()[2] == 19
+    assert core.obter_refresh_token() == "n" * 64
+    assert core.ler_aba_espelho(core.NOME_ABA_CONFIG)[1][2] == planilha.abas[core.NOME_ABA_CONFIG].valores()[1][2]
+
+
+def test_lote_retroativo_so_conta_rodadas_anteriores(nucleo, monkeypatch):
+    # Rodadas 4 a 10 ja lancadas, com A cobrado em todas
+    core, _ = nucleo(grade=[COLUNAS_ESPERADAS] + [
+        ["2026-04-01", rod, t, 7.0 if t == "A" else 0.0, "FALSE" if t == "A" else "TRUE", "Lanterna" if t == "A" else "Salvo", pos]
+        for rod in range(4, 11) for pos, t in enumerate("DCBA", start=1)
+    ], n_times=4)
+    monkeypatch.setattr(core, "LIMITE_MAX_PAGAMENTOS", 3)
+    df_fin, _ = core.carregar_dados()
+    ranking = pd.DataFrame({"Time": list("DCBA"), "Posição": [1.0, 2.0, 3.0, 4.0]})
+
+    # Na rodada 3 A ainda nao tinha nenhuma cobranca: paga, mesmo com 7 cobrancas depois dela
+    df_lote, resumo = core.lancar_rodadas_em_lote(df_fin, {3: ranking})
+
+    rodada3 = df_lote[df_lote["Rodada"] == 3].assign(Time=lambda d: d["Time"].astype(str)).set_index("Time")
+    assert rodada3.at["A", "Motivo"] == "Lanterna"
+    assert rodada3.at["A", "Valor"] == core.VALOR_RODADA
+    assert resumo.loc[0, "Imunes"] == 0
+
+
+def test_datas_fora_do_iso_sobrevivem_a_regravacao(nucleo):
+    grade = [COLUNAS_ESPERADAS,
+             ["2026-04-01", 1, "A", 7.0, "FALSE", "Lanterna", 2],
+             ["03/04/2026", 1, "B", 0.0, "TRUE", "Salvo", 1],
+             ["ontem", 2, "A", 0.0, "TRUE", "Salvo", 1],
+             ["", 2, "B", 7.0, "FALSE", "Lanterna", 2]]
+    core, planilha = nucleo(grade=grade, n_times=2)
+    df_fin, _ = core.carregar_dados()
+
+    # Regravacao completa (sem snapshot): passa por espelho -> aplicar_esquema -> serializar_dados
+    core.salvar_dados(df_fin.assign(Pago=True))
+
+    assert [l[0] for l in planilha.abas[core.NOME_ABA_DADOS].valores()[1:]] == ["2026-04-01", "03/04/2026", "ontem", ""]
+    df_novo, _ = core.carregar_dados()
+    assert df_novo["Data"].iloc[1] == pd.Timestamp(2026, 4, 3)
+
+
+def test_gravacao_pendente_nao_apaga_edicao_feita_na_planilha(nucleo, monkeypatch):
+    grade = [COLUNAS_ESPERADAS,
+             ["2026-04-01", 1, "A", 7.0, "FALSE", "Lanterna", 2],
+             ["2026-04-01", 1, "B", 7.0, "FALSE", "Lanterna", 1]]
+    core, planilha = nucleo(grade=grade, n_times=2)
+    df_fin, _ = core.carregar_dados()
+
+    # Planilha fora do ar: A paga e fica pendente no espelho
+    with monkeypatch.context() as m:
+        m.setattr(core, "conectar_gsheets", lambda: None)
+        assert core.salvar_dados(df_fin.assign(Pago=[True, False]), df_fin) is False
+    # Enquanto isso outra sessao marca B como pago direto na planilha
+    planilha.abas[core.NOME_ABA_DADOS].update([["TRUE"]], "E3")
+    core.marcar_revisao()
+
+    assert core.sincronizar_espelho()
+
+    assert [l[4] for l in planilha.abas[core.NOME_ABA_DADOS].valores()[1:]] == ["TRUE", "TRUE"]
+    df_novo, _ = core.carregar_dados()
+    assert df_novo["Pago"].tolist() == [True, True]
+
+
+def test_gravacao_incremental_com_planilha_alterada_regrava_sem_perder_linhas(nucleo):
+    grade = [COLUNAS_ESPERADAS,
+             ["2026-04-01", 1, "A", 7.0, "FALSE", "Lanterna", 2],
+             ["2026-04-01", 1, "B", 0.0, "TRUE", "Salvo", 1],
+             ["2026-04-08", 2, "A", 7.0, "FALSE", "Lanterna", 2]]
+    core, planilha = nucleo(grade=grade, n_times=2)
+    df_fin, _ = core.carregar_dados()
+
+    # Outra sessao apaga a linha 2 (o mapa de linhas do snapshot fica velho) e acrescenta a rodada 2 de B
+    aba = planilha.abas[core.NOME_ABA_DADOS]
+    aba.clear()
+    aba.update([grade[0], grade[1], grade[3], ["2026-04-08", 2, "B", 0.0, "TRUE", "Salvo", 1]])
+    core.marcar_revisao()
+
+    # A rodada 2 de A paga, a partir do snapshot antigo
+    assert core.salvar_dados(df_fin.assign(Pago=[False, True, True]), df_fin)
+
+    linhas = {(l[1], l[2]): l[4] for l in aba.valores()[1:]}
+    assert linhas == {("1", "A"): "FALSE", ("2", "A"): "TRUE", ("2", "B"): "TRUE"}
+
+
+def test_arquivar_depois_do_reset_recria_aba_com_cabecalho(nucleo):
+    grade = planilha_fake.gerar_livro_caixa(COLUNAS_ESPERADAS, 12, 25)
+    core, planilha = nucleo(grade=grade)
+    core.arquivar_ate(19)
+
+    core.resetar_banco_dados()
+    planilha.abas[core.NOME_ABA_DADOS].update(grade)
+    core.marcar_revisao()
+    core.arquivar_ate(19)
+
+    assert planilha.abas["Arquivo T01"].valores()[0] == COLUNAS_ESPERADAS
+    df_fin, _ = core.carregar_dados()
+    hist = core.historico_completo(df_fin)
+    assert len(hist) == len(grade) - 1
+    assert hist["Rodada"].between(1, 25).all() and (hist["Time"].astype(str) != "").all()
+
+
+@pytest.mark.parametrize("config", ["ausente", "antiga com 2 colunas"])
+def test_abas_criadas_pelo_app_cabem_no_que_ele_le_e_grava(nucleo, config):
+    core, planilha = nucleo(n_times=150, n_rodadas=20)
+    if config == "ausente": del planilha.abas[core.NOME_ABA_CONFIG]
+    else: planilha.abas[core.NOME_ABA_CONFIG] = planilha_fake.AbaFake(planilha, core.NOME_ABA_CONFIG, 1, [["RefreshToken_Atualizado"], ["r" * 64]], rows=10, cols=2)
+
+    _, status = core.carregar_dados()
+    assert status == "Sucesso"
+    # Acumulado criado com 100 linhas e mais de 99 times cobrados no turno
+    assert core.arquivar_ate(19) > 0
+
+    cobrancas, _, ate = core.acumulado_arquivado()
+    assert ate == 19 and len(cobrancas) > 99
+    assert len(planilha.abas[core.NOME_ABA_ACUMULADO].valores()) == len(cobrancas) + 1
+
+
+@pytest.mark.parametrize("aba_que_falha", ["Acumulado", "Dados"])
+def test_arquivar_de_novo_depois_de_falha_no_meio_nao_duplica(nucleo, monkeypatch, aba_que_falha):
+    core, _ = nucleo()
+    core.arquivar_ate(19)
+    esperado = core.acumulado_arquivado()
+
+    core, planilha = nucleo()
+    reescrever = core._reescrever_planilha
+    def falha_uma_vez(sheet, df_save):
+        if sheet.title == aba_que_falha and not falhou:
+            falhou.append(sheet.title)
+            raise ConnectionError("queda no meio do arquivamento")
+        return reescrever(sheet, df_save)
+    falhou = []
+    monkeypatch.setattr(core, "_reescrever_planilha", falha_uma_vez)
+    with pytest.raises(ConnectionError): core.arquivar_ate(19)
+    assert core.acumulado_arquivado()[2] == 0
+
+    core.arquivar_ate(19)
+
+    cobrancas, pago, ate = core.acumulado_arquivado()
+    assert ate == 19 and pago == esperado[1]
+    pd.testing.assert_series_equal(cobrancas.sort_index(), esperado[0].sort_index())
+    arquivo = planilha.abas["Arquivo T01"].valores()[1:]
+    assert len({(l[1], l[2]) for l in arquivo}) == len(arquivo)
+
+
+def test_espelho_travado_nao_derruba_a_sincronia(nucleo, monkeypatch):
+    core, _ = nucleo()
+    core.carregar_dados()
+    def travado(*args, **kwargs): raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(core, "_gravar_espelho", travado)
+    core.marcar_revisao()
+
+    assert core.atualizar_espelho(forcar=True) is False
+
+    # O laco segue vivo depois de erros inesperados
+    class Parar(BaseException): pass
+    chamadas = []
+    def atualizar(forcar=False):
+        chamadas.append(forcar)
+        if len(chamadas) < 3: raise RuntimeError("falha inesperada")
+        raise Parar
+    monkeypatch.setattr(core, "INTERVALO_REVISAO", 0)
+    monkeypatch.setattr(core, "atualizar_espelho", atualizar)
+    with pytest.raises(Parar): core._laco_sincronia()
+    assert len(chamadas) == 3
+
+
+def test_monitor_busca_o_ranking_final_quando_o_mercado_abre(nucleo, monkeypatch):
+    core, _ = nucleo()
+    core._rankings_ao_vivo.clear()
+    aberto, ao_vivo = 1, core.STATUS_MERCADO_AO_VIVO
+    class Parar(BaseException): pass
+    status = iter([(5, ao_vivo), (5, ao_vivo), (6, aberto), (6, aberto)])
+    def status_mercado():
+        try: return next(status)
+        except StopIteration: raise Parar
+    consultas = []
+    def atualizar(slugs, rodada=None):
+        consultas.append(rodada)
+        cache = core._rankings_ao_vivo()
+        cache["ligas"]["liga"] = {"ranking": None, "rodada": rodada, "erro": None}
+    monkeypatch.setattr(core, "_status_mercado", status_mercado)
+    monkeypatch.setattr(core, "atualizar_rankings_ao_vivo", atualizar)
+    monkeypatch.setattr(core, "INTERVALO_MONITOR_RANKING", 0)
+    monkeypatch.setattr(core, "INTERVALO_MONITOR_MERCADO", 0)
+
+    with pytest.raises(Parar): core._laco_monitor_ranking(["liga"])
+
+    # Duas leituras ao vivo, uma depois do fim da rodada 5 e nenhuma mais com o mercado aberto
+    assert consultas == [5, 5, 5]
+    assert core.ranking_ao_vivo("liga")["rodada"] == 5
+    core._rankings_ao_vivo.clear()
+
+
+def test_backends_falsos_nao_gravam_no_cache_da_api_de_verdade(nucleo, tmp_path):
+    padrao = os.path.join(os.path.dirname(os.path.abspath(cartola_core.__file__)), "cache_api_cartola")
+    antes = set(os.listdir(padrao)) if os.path.isdir(padrao) else None
+    core, _ = nucleo(n_times=4)
+
+    rankings = core.buscar_historico_liga(core.SLUG_LIGA_PADRAO, 1, 2)
+
+    assert sorted(rankings) == [1, 2]
+    assert core.PASTA_CACHE_API.startswith(str(tmp_path)) and os.listdir(core.PASTA_CACHE_API)
+    assert (set(os.listdir(padrao)) if os.path.isdir(padrao) else None) == antes
+
+
+def test_rodada_unica_fora_da_janela_nao_vira_coluna_de_rodada(nucleo):
+    core, _ = nucleo(n_times=4, n_rodadas=11)
+    df_fin, _ = core.carregar_dados()
+    disp, todas_rodadas = core.montar_matriz_resumo(df_fin, 1, 11)
+
+    grade = core.janela_resumo(disp, todas_rodadas, todas_rodadas[:10])
+
+    assert list(grade.columns[-11:]) == todas_rodadas[:10] + ["11 (resumo)"]
+    assert "11" not in grade.columns